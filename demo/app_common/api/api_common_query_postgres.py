@@ -10,10 +10,14 @@ from aloha.service.api.v0 import APIHandler
 
 
 class ApiQueryPostgres(APIHandler):
+    EXECUTOR = 'thread'  # do not block the event loop when querying DB
+
     def response(self, sql: str, orient: str = 'columns', config_profile: str = None,
-                 params=None, *args, **kwargs) -> str:
+                 params=None, stream: bool = False, *args, **kwargs):
         op_query_db = QueryDb()
         df = op_query_db.query_db(sql=sql, config_profile=config_profile, params=params)
+        if stream:  # stream the rows as records in chunks, instead of serializing the whole DataFrame at once
+            return df
         ret = df.to_json(orient=orient, force_ascii=False)
         return ret
 
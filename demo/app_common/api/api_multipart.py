@@ -1,5 +1,6 @@
 from aloha.logger import LOG
 from aloha.service.api.v0 import APIHandler
+from aloha.service.http import StreamingApiHandler
 
 
 class MultipartHandler(APIHandler):
@@ -8,7 +9,17 @@ class MultipartHandler(APIHandler):
         return params
 
 
+class MultipartStreamingHandler(StreamingApiHandler, APIHandler):
+    async def response(self, params=None, url_files=None, *args, **kwargs):
+        files = []
+        async for file_key, file_name, content_type, file in self.aiter_request_files(url_files, max_concurrency=4):
+            with file:
+                files.append({'key': file_key, 'name': file_name, 'content_type': content_type, 'size': len(file.read())})
+        return {'params': params, 'files': files}
+
+
 default_handlers = [
     # internal API: QueryDB Postgres with sql directly
     (r"/api_internal/multipart", MultipartHandler),
+    (r"/api_internal/multipart_streaming", MultipartStreamingHandler),
 ]
@@ -9,18 +9,17 @@ def main():
         "app_common.api.api_multipart",
     ]
 
-    if 'service' not in SETTINGS.config:
-        SETTINGS.config['service'] = {}
-
-    # load the service modules from SETTINGS.config['service']['modules']
-    SETTINGS.config['service'].update({
-        'modules': modules_to_load,
-        'debug': True,
+    # the config is immutable, override it before the app starts
+    SETTINGS.override({
+        # load the service modules from SETTINGS.config['service']['modules']
+        'service': {
+            'modules': modules_to_load,
+            'debug': True,
+        },
+        # Use self defined 404 handler
+        'default_handler_class': DefaultHandler404,
     })
 
-    # Use self defined 404 handler
-    SETTINGS.config['default_handler_class'] = DefaultHandler404
-
     app = Application()
 
     # The event loop starts after start.
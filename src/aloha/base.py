@@ -1,9 +1,9 @@
 from abc import ABC
 
 from .logger import LOG
-from .settings import SETTINGS
+from .settings import ConfigProperty
 
 
 class BaseModule(ABC):
-    config = SETTINGS.config
+    config = ConfigProperty()  # the current config, reloaded if the config files are changed
     LOG = LOG
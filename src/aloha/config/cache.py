@@ -0,0 +1,134 @@
+__all__ = ('get_cache_path', 'compute_fingerprint', 'load_snapshot', 'save_snapshot', 'load_config_cached')
+
+import hashlib
+import json
+import os
+import re
+import warnings
+
+from . import paths
+
+VERSION = 1
+# substitutions like `${VAR}` or `${?VAR}`, which are resolved from environment variables if not found in config
+_RE_SUBSTITUTION = re.compile(r'\$\{\??\s*([A-Za-z_][\w.-]*)\s*}')
+# included files like `include "a.conf"`, `include required(file("/etc/a.conf"))`
+_RE_INCLUDE = re.compile(r'include\s+(?:required\s*\(\s*)?(?:file\s*\(\s*)?"([^"]+)"')
+# environment variables which decide the config files to load
+_ENV_FILES = ('DIR_RESOURCE', 'DIR_CONFIG', 'FILES_CONFIG', 'ENV_PROFILE')
+
+
+def _get_cache_dir(base_dir: str) -> str:
+    return os.path.abspath(os.environ.get('DIR_CONFIG_CACHE') or os.path.join(base_dir, '.cache'))
+
+
+def get_cache_path(config_files: list, base_dir: str) -> str:
+    """Path of the snapshot of the given config files, in `DIR_CONFIG_CACHE` (default to `{config_dir}/.cache`)."""
+    key = hashlib.sha256(json.dumps([base_dir, list(config_files)]).encode()).hexdigest()[:16]
+    return os.path.join(_get_cache_dir(base_dir), 'config-%s.json' % key)
+
+
+def _scan_sources(config_files: list, base_dir: str) -> tuple:
+    """Return the source files: files in the config dir (recursively) and files included from outside of it,
+    and the names of environment variables they may refer to.
+    """
+    dir_cache = _get_cache_dir(base_dir)
+    pending = [os.path.join(base_dir, f) for f in config_files]
+    for dir_path, dir_names, file_names in os.walk(base_dir):
+        dir_names[:] = [d for d in dir_names if not d.startswith('.') and os.path.join(dir_path, d) != dir_cache]
+        pending.extend(os.path.join(dir_path, f) for f in file_names if not f.startswith('.'))
+
+    files, names = set(), set(_ENV_FILES)
+    while pending:
+        path = os.path.abspath(pending.pop())
+        if path in files or not os.path.isfile(path):
+            continue
+        files.add(path)
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        names.update(_RE_SUBSTITUTION.findall(content))
+        pending.extend(os.path.join(os.path.dirname(path), i) for i in _RE_INCLUDE.findall(content))
+    return sorted(files), sorted(names)
+
+
+def _stat_files(files: list) -> list:
+    ret = []
+    for path in files:
+        st = os.stat(path)
+        ret.append([path, st.st_mtime_ns, st.st_size])
+    return ret
+
+
+def _hash_env(names: list) -> str:
+    return hashlib.sha256(json.dumps([[name, os.environ.get(name)] for name in names]).encode()).hexdigest()
+
+
+def compute_fingerprint(config_files: list, base_dir: str) -> dict:
+    """Fingerprint of the config: (mtime, size) of the source files, and the values of the environment variables they refer."""
+    files, names = _scan_sources(config_files, base_dir)
+    return {'version': VERSION, 'files': _stat_files(files), 'env_names': names, 'env': _hash_env(names)}
+
+
+def _is_fresh(snapshot: dict, config_files: list, base_dir: str) -> bool:
+    if snapshot.get('version') != VERSION:
+        return False
+    try:
+        files = [path for path, _, _ in snapshot['files']]
+        if _stat_files(files) != snapshot['files'] or _hash_env(snapshot['env_names']) != snapshot['env']:
+            return False
+    except (OSError, KeyError, ValueError):  # e.g. file removed
+        return False
+    # files added to the config dir since the snapshot, which may be included
+    return files == _scan_sources(config_files, base_dir)[0]
+
+
+def load_snapshot(config_files: list, base_dir: str):
+    """Load the config from its snapshot if the source files and environment variables are not changed, otherwise None."""
+    path = get_cache_path(config_files, base_dir)
+    try:
+        with open(path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not _is_fresh(snapshot, config_files, base_dir):
+        return None
+    return snapshot['config']
+
+
+def save_snapshot(config: dict, config_files: list, base_dir: str, fingerprint: dict = None) -> str:
+    """Save the resolved config with the fingerprint of its sources, return the path of the snapshot.
+    :param fingerprint: computed before resolving the config, so changes in the meantime are not missed
+    """
+    snapshot = dict(fingerprint or compute_fingerprint(config_files, base_dir))
+    snapshot['config'] = config
+    path = get_cache_path(config_files, base_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    path_tmp = '%s.%s.tmp' % (path, os.getpid())
+    with open(path_tmp, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(path_tmp, path)  # atomic, other processes never read a partial snapshot
+    return path
+
+
+def load_config_cached(config_files: list = None, base_dir: str = None, save: bool = None) -> dict:
+    """Load the config from the snapshot compiled by `aloha config compile` if it is fresh, otherwise parse the HOCON files.
+    The snapshot is (re)written after parsing if `save`, default to environment variable `CONFIG_CACHE` set as true.
+    Notice: the snapshot contains resolved values, including secrets in the config or environment variables.
+    """
+    base_dir = base_dir or paths.get_config_dir()
+    config_files = paths.get_config_files() if config_files is None else config_files
+    config = load_snapshot(config_files, base_dir)
+    if config is not None:
+        return config
+
+    if save is None:
+        save = os.environ.get('CONFIG_CACHE', '').lower() in ('1', 'true', 'yes')
+    if save:
+        fingerprint = compute_fingerprint(config_files, base_dir)
+    from . import hocon  # notice: imported only when needed, as importing `pyhocon` also takes time
+    config = hocon.load_plain_config_from_hocon_files(config_files, base_dir=base_dir)
+    if save:
+        try:
+            save_snapshot(config, config_files, base_dir, fingerprint=fingerprint)
+        except OSError as e:  # e.g. config dir is read-only
+            warnings.warn('Failed to save config snapshot: %s' % e)
+    return config
@@ -0,0 +1,128 @@
+__all__ = ('FrozenConfig', 'freeze', 'thaw', 'merge')
+
+from typing import Any
+
+_MISSING = object()
+_TRUE = ('1', 'true', 'yes', 'on')
+_FALSE = ('0', 'false', 'no', 'off', '')
+
+
+def freeze(value):
+    """Convert dicts to `FrozenConfig` and lists to tuples, recursively."""
+    if isinstance(value, FrozenConfig):
+        return value
+    if isinstance(value, dict):
+        return FrozenConfig(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(i) for i in value)
+    return value
+
+
+def thaw(value):
+    """Plain (mutable) copy of a frozen value: dicts and lists, recursively."""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(i) for i in value]
+    return value
+
+
+def merge(base: dict, values: dict) -> dict:
+    """Plain dict of `base` updated by `values` recursively: nested dicts are merged, other values are replaced."""
+    ret = {k: thaw(v) for k, v in base.items()}
+    for k, v in values.items():
+        if isinstance(v, dict) and isinstance(ret.get(k), dict):
+            ret[k] = merge(ret[k], v)
+        else:
+            ret[k] = thaw(v)
+    return ret
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        s = value.strip().lower()
+        if s in _TRUE:
+            return True
+        if s in _FALSE:
+            return False
+        raise ValueError('Invalid boolean value: %s' % value)
+    return bool(value)
+
+
+class FrozenConfig(dict):
+    """Immutable config tree, read-optimized for hot paths:
+    - a plain `dict` subclass, so `config['key']` and `config.get('key')` cost the same as dict lookups;
+      notice: attribute access `config.key` of `AttrDict` is not supported, as `__getattr__` slows down every method call;
+    - dotted key paths are looked up in O(1) from a flat index, e.g. `config.get_path('service.timing.enabled')`;
+    - typed accessors `get_int` / `get_float` / `get_bool` / `get_str` convert each value once and cache it.
+    Nested dicts are `FrozenConfig` and lists are tuples, mutating methods raise `TypeError`,
+    so the same tree is safely shared by threads, and by forked workers without being copied (see `gc.freeze`).
+    Use `thaw` to get a mutable copy, or `merge` to derive a new config, e.g. by `SETTINGS.override`.
+    """
+    __slots__ = ('_paths', '_typed')
+
+    def __init__(self, data=(), **kwargs):
+        dict.__init__(self, ((k, freeze(v)) for k, v in dict(data, **kwargs).items()))
+        object.__setattr__(self, '_paths', None)  # dotted key path -> value, built on the first lookup by path
+        object.__setattr__(self, '_typed', {})  # (type, key path) -> converted value
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('%s is immutable, use `thaw` to get a mutable copy, or `SETTINGS.override`' % type(self).__name__)
+
+    __setitem__ = __delitem__ = __setattr__ = __ior__ = _readonly
+    pop = popitem = clear = update = setdefault = _readonly
+
+    def __reduce__(self):  # for pickle and `copy.deepcopy`, which otherwise set the items one by one
+        return type(self), (thaw(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    # ---------------------------------------- lookup by path ----------------------------------------
+    def _build_paths(self) -> dict:
+        paths = {}
+        stack = [('', self)]
+        while stack:
+            prefix, node = stack.pop()
+            for k, v in node.items():
+                path = '%s%s' % (prefix, k)
+                paths.setdefault(path, v)  # notice: keys containing `.` may be shadowed by nested keys
+                if isinstance(v, dict):
+                    stack.append((path + '.', v))
+        object.__setattr__(self, '_paths', paths)
+        return paths
+
+    def get_path(self, key_path: str, default=None) -> Any:
+        """Value by dotted key path, e.g. `APP_OPTIONS.replay_check.enabled`, or `default` if not found."""
+        paths = self._paths
+        if paths is None:
+            paths = self._build_paths()
+        return paths.get(key_path, default)
+
+    def _convert(self, kind: type, convert, key_path: str, default):
+        value = self.get_path(key_path, _MISSING)
+        if value is _MISSING or value is None:
+            return default
+        value = self._typed[kind, key_path] = convert(value)
+        return value
+
+    # notice: the typed accessors look up the converted value in place, as calling another function doubles the cost
+    def get_int(self, key_path: str, default: int = None) -> int:
+        value = self._typed.get((int, key_path), _MISSING)
+        return self._convert(int, int, key_path, default) if value is _MISSING else value
+
+    def get_float(self, key_path: str, default: float = None) -> float:
+        value = self._typed.get((float, key_path), _MISSING)
+        return self._convert(float, float, key_path, default) if value is _MISSING else value
+
+    def get_bool(self, key_path: str, default: bool = None) -> bool:
+        """Boolean value, strings like `true` / `yes` / `1` / `on` are converted."""
+        value = self._typed.get((bool, key_path), _MISSING)
+        return self._convert(bool, _to_bool, key_path, default) if value is _MISSING else value
+
+    def get_str(self, key_path: str, default: str = None) -> str:
+        value = self._typed.get((str, key_path), _MISSING)
+        return self._convert(str, str, key_path, default) if value is _MISSING else value
@@ -1,18 +1,22 @@
-from attrdict import AttrDict
 from pyhocon import ConfigFactory
 
+from .frozen import FrozenConfig
+
 
 def load_config_from_hocon(config_file):
     config = ConfigFactory.parse_file(config_file).as_plain_ordered_dict()
     return config
 
 
-def load_config_from_hocon_files(config_files: list, base_dir: str):
+def load_plain_config_from_hocon_files(config_files: list, base_dir: str) -> dict:
     s = []
     for config_file in config_files:
         f = 'include required("%s")' % config_file
         s.append(f)
     f = '\n'.join(s)
 
-    config = ConfigFactory.parse_string(content=f, basedir=base_dir).as_plain_ordered_dict()
-    return AttrDict(config)
+    return ConfigFactory.parse_string(content=f, basedir=base_dir).as_plain_ordered_dict()
+
+
+def load_config_from_hocon_files(config_files: list, base_dir: str):
+    return FrozenConfig(load_plain_config_from_hocon_files(config_files, base_dir=base_dir))
@@ -25,7 +25,7 @@ class KafkaOperator:
 
         if 'host' in kafka_config:
             self._config = {
-                'bootstrap.servers': ','.join(['{host}:{port}'.format(**i) for i in kafka_config.pop('host')]),
+                'bootstrap.servers': ','.join(['{host}:{port}'.format(**i) for i in kafka_config['host']]),
             }
         LOG.debug("Kafka connection info: " + str(self._config))
 
@@ -65,7 +65,7 @@ class KafkaOperator:
             if err is not None:
                 LOG.error('Kafka msg delivery failed: {}'.format(err))
             else:
-                LOG.debug('Kafka msg delivered to {} [{}]'.format(msg.topic(), msg.partition()))
+                LOG.debug('Kafka msg delivered to %s [%s]', msg.topic(), msg.partition(), extra={'log_limit': 'kafka_message'})
 
         if func_callback is None:
             func_callback = delivery_report
@@ -89,20 +89,21 @@ class KafkaOperator:
         c = kafka.Consumer(config_consumer)
 
         c.subscribe(topics_subscribe)
-        while True:
-            msg = c.poll(poll_timeout)
-
-            if msg is None:
-                continue
-            elif msg.error():
-                code = msg.error().code()
-                if code == kafka.KafkaError._PARTITION_EOF:
-                    pass
-                LOG.error("Kafka consumer: {}".format(msg.error()))
-                continue
-
-            data = msg.value().decode('utf-8')
-            LOG.debug('Received message: {}'.format(data))
-            yield data
-
-        c.close()
+        try:
+            while True:
+                msg = c.poll(poll_timeout)
+
+                if msg is None:
+                    continue
+                elif msg.error():
+                    code = msg.error().code()
+                    if code == kafka.KafkaError._PARTITION_EOF:
+                        pass
+                    LOG.error("Kafka consumer: {}".format(msg.error()))
+                    continue
+
+                data = msg.value().decode('utf-8')
+                LOG.debug('Received message: %s', data, extra={'log_limit': 'kafka_message'})
+                yield data
+        finally:  # leave the consumer group (and commit offsets) when the generator is closed
+            c.close()
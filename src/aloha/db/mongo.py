@@ -46,7 +46,7 @@ class _MongoDBOperation:
 
         host = config['host']
 
-        if config.get('port') is None and isinstance(host, list):
+        if config.get('port') is None and isinstance(host, (list, tuple)):
             hosts = ['{host}:{port}'.format(**h) for h in host]
         else:
             hosts = ['{host}:{port}'.format(host=host, port=config['port'])]
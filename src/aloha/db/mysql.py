@@ -6,6 +6,7 @@ from sqlalchemy.sql import text
 
 from .base import PasswordVault
 from ..logger import LOG
+from ..util import shutdown
 
 LOG.debug('Version of pymysql = %s' % pymysql.__version__)
 
@@ -31,6 +32,12 @@ class MySqlOperator:
             LOG.exception(e)
             raise RuntimeError('Failed to connect to MySQL')
 
+        shutdown.register(self.close, weak=True)
+
+    def close(self):
+        """Close the connections in the pool of engine."""
+        self.db.dispose()
+
     @property
     def connection(self):
         return self.db
@@ -6,6 +6,7 @@ from sqlalchemy.sql import text
 
 from .base import PasswordVault
 from ..logger import LOG
+from ..util import shutdown
 
 LOG.debug('postgres: psycopg version = %s' % psycopg.__version__)
 
@@ -35,6 +36,12 @@ class PostgresOperator:
             LOG.error(e)
             raise RuntimeError("Failed to connect to PostgresSQL")
 
+        shutdown.register(self.close, weak=True)
+
+    def close(self):
+        """Close the connections in the pool of engine."""
+        self.engine.dispose()
+
     @property
     def connection(self):
         return self.engine
@@ -5,6 +5,7 @@ from packaging import version
 
 from .base import PasswordVault
 from ..logger import LOG
+from ..util import shutdown
 
 
 class RedisOperator:
@@ -27,6 +28,13 @@ class RedisOperator:
         self._config = _config
 
         self._pool = None
+        shutdown.register(self.close, weak=True)
+
+    def close(self):
+        """Disconnect the connections in the pool."""
+        if self._pool is not None:
+            self._pool.disconnect()
+            self._pool = None
 
     @staticmethod
     def _check_redis_version() -> bool:
@@ -0,0 +1,51 @@
+__all__ = ('SIGN_METHODS', 'canonical_json', 'get_sign', 'check_sign')
+
+import hashlib
+import hmac
+import json
+
+_HASH_FUNCS = {'md5': hashlib.md5, 'sha256': hashlib.sha256}
+SIGN_METHODS = ('md5', 'sha256', 'hmac-md5', 'hmac-sha256')
+
+
+def canonical_json(data) -> bytes:
+    """Canonical form of data to sign: JSON with sorted keys, compact separators and non-ASCII chars kept, in UTF-8."""
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def _new_hash(sign_method: str, app_key: str):
+    if sign_method not in SIGN_METHODS:
+        raise ValueError('Invalid `sign_method`: %s' % sign_method)
+    if sign_method.startswith('hmac-'):
+        return hmac.new(app_key.encode(), digestmod=_HASH_FUNCS[sign_method[5:]])
+    return _HASH_FUNCS[sign_method]()
+
+
+def get_sign(app_id: str, salt_uuid: str, app_key: str, data=None, sign_method: str = 'md5') -> str:
+    """Sign of a request:
+    - md5 / sha256: hash(app_id + salt_uuid + data + app_key)
+    - hmac-md5 / hmac-sha256: hmac(key=app_key, msg=app_id + salt_uuid + data)
+    where data is serialized by `canonical_json` once,
+    and the parts are fed to the hash object one by one instead of concatenating a big string.
+    """
+    h = _new_hash(sign_method, app_key)
+    h.update(app_id.encode())
+    h.update(salt_uuid.encode())
+    h.update(canonical_json(data))
+    if not sign_method.startswith('hmac-'):
+        h.update(app_key.encode())
+    return h.hexdigest()
+
+
+def check_sign(sign, app_id: str, salt_uuid: str, app_key: str, data, sign_method: str = 'md5') -> bool:
+    """Validate the sign in constant time, the legacy sign `hash(app_id + salt_uuid + app_key)` is accepted for md5/sha256."""
+    sign = str(sign).encode()
+
+    if not sign_method.startswith('hmac-'):  # --> Compatible with older version API
+        h = _new_hash(sign_method, app_key)
+        h.update((app_id + salt_uuid + app_key).encode())
+        if hmac.compare_digest(sign, h.hexdigest().encode()):
+            return True
+
+    right_sign = get_sign(app_id=app_id, salt_uuid=salt_uuid, app_key=app_key, data=data, sign_method=sign_method)
+    return hmac.compare_digest(sign, right_sign.encode())
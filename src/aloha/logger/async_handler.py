@@ -0,0 +1,162 @@
+__all__ = ('BoundedQueueHandler', 'BatchingQueueListener')
+
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from logging.handlers import BaseRotatingHandler, QueueHandler
+
+_listeners = weakref.WeakSet()  # listeners to be restarted in forked child processes
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Put log records into a bounded queue, so that the calling thread (e.g. the event loop) never waits for disk IO.
+    When the queue is full, the record is dropped (`policy='drop'`), or the caller waits up to `block_timeout` seconds
+    and then drops it (`policy='block'`); dropped records are counted in `n_dropped`.
+    """
+
+    def __init__(self, maxsize: int = 10000, policy: str = 'drop', block_timeout: float = 1.0):
+        if policy not in ('drop', 'block'):
+            raise ValueError('Invalid log queue policy: %s' % policy)
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.policy, self.block_timeout = policy, block_timeout
+        self.n_dropped = 0
+        self.listener: 'BatchingQueueListener' = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # only merge the arguments into the message, the handlers of the listener format the record in its thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.policy == 'block':
+                self.queue.put(record, block=True, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.n_dropped += 1  # notice: not locked, the count may be slightly lower under contention
+
+    def flush(self) -> None:
+        """Wait (up to 5 seconds) for the queued records to be written."""
+        if self.listener is not None:
+            self.listener.wait_empty(timeout=5)
+
+
+class BatchingQueueListener:
+    """Background thread taking records from the queue of `BoundedQueueHandler` in batches,
+    each batch is formatted and written to the handlers with one write and one flush per handler.
+    Dropped records are reported by a warning written to the handlers.
+    """
+
+    def __init__(self, handler: BoundedQueueHandler, handlers: list, batch_size: int = 256):
+        self.handler = handler
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._n_dropped_reported = 0
+        self._reported_at = 0.0
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()  # held while writing a batch, and while forking
+        self._thread: threading.Thread = None
+        handler.listener = self
+        _listeners.add(self)
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='aloha-log-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write the queued records and stop the thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait_empty(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while self.handler.queue.unfinished_tasks > 0 and self._thread is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _after_fork_in_child(self) -> None:
+        # the thread does not exist in the child process, and the queue may be locked by it at the time of fork
+        self._write_lock = threading.Lock()
+        self.handler.queue = queue.Queue(maxsize=self.handler.queue.maxsize)
+        if self._thread is not None:
+            self._thread = None
+            self.start()
+
+    def _run(self) -> None:
+        q = self.handler.queue
+        while True:
+            try:
+                batch = [q.get(timeout=0.1)]
+            except queue.Empty:
+                if self._stop.is_set():
+                    break
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+
+            n_queued = len(batch)
+            n_dropped = self.handler.n_dropped
+            if n_dropped > self._n_dropped_reported and (time.monotonic() - self._reported_at > 1 or self._stop.is_set()):
+                batch.append(logging.makeLogRecord({  # reported at most once per second
+                    'name': 'aloha.logger', 'module': 'async_handler', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': '%d log record(s) dropped, the log queue is full!' % (n_dropped - self._n_dropped_reported),
+                }))
+                self._n_dropped_reported, self._reported_at = n_dropped, time.monotonic()
+
+            with self._write_lock:  # not forked in the middle of writing, which leaves the locks of streams acquired
+                for handler in self.handlers:
+                    _emit_batch(handler, batch)
+            for _ in range(n_queued):
+                q.task_done()
+
+
+def _emit_batch(handler: logging.Handler, records: list) -> None:
+    records = [r for r in records if r.levelno >= handler.level and handler.filter(r)]
+    if not records:
+        return
+    if not isinstance(handler, logging.StreamHandler):
+        for record in records:
+            handler.handle(record)
+        return
+
+    handler.acquire()
+    try:
+        if isinstance(handler, BaseRotatingHandler) and handler.shouldRollover(records[0]):
+            handler.doRollover()
+        if handler.stream is None:  # file handler opened with `delay=True`
+            handler.stream = handler._open()
+        handler.stream.write(''.join(handler.format(record) + handler.terminator for record in records))
+        handler.flush()
+    except Exception:
+        handler.handleError(records[0])
+    finally:
+        handler.release()
+
+
+def _before_fork():
+    for listener in list(_listeners):
+        listener._write_lock.acquire()
+
+
+def _after_fork_in_parent():
+    for listener in list(_listeners):
+        listener._write_lock.release()
+
+
+def _after_fork_in_child():
+    for listener in list(_listeners):
+        listener._after_fork_in_child()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent, after_in_child=_after_fork_in_child)
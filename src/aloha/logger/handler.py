@@ -1,43 +1,104 @@
+import gzip
+import os
+import shutil
+import threading
 import time
+import weakref
 from logging import StreamHandler
 from logging.handlers import BaseRotatingHandler
 
+_handlers = weakref.WeakSet()  # instances to reopen in forked child processes
+
 
 class MultiProcessSafeDailyRotatingFileHandler(BaseRotatingHandler):
     """Similar with `logging.TimedRotatingFileHandler`, while this one is
-    - Multi process safe
-    - Rotate at midnight only
+    - Multi process safe: files are never renamed, a new file named by date (and index) is opened instead
+    - Rotate at midnight, and optionally when the file reaches `max_bytes` (`{name}_{date}.1.log`, `.2.log`, ...)
+    - Rotated files are optionally compressed with gzip in a background thread
+    - File names including the pid (`_p{pid}`, as set by `setup_logger`) are reopened with the pid of forked child processes,
+      e.g. workers of the web service, so each process rotates and compresses its own files only
     - Utc not supported
     """
 
-    def __init__(self, filename: str, encoding='utf8', delay=False, utc=False, **kwargs):
+    def __init__(self, filename: str, encoding='utf8', delay=False, utc=False, max_bytes: int = 0, compress: bool = False, **kwargs):
+        """
+        :param max_bytes: also rotate when the file written by this handler reaches the size, 0 to rotate daily only
+        :param compress: gzip the rotated files, only if the file is not written by other processes (default file names include pid)
+        """
         self.utc = utc
         self.suffix = "%Y-%m%d"
+        self.max_bytes, self.compress = max_bytes, compress
         self.baseFilename = filename
+        self.index = 0  # index of the file rotated by size in the same day
+        self.rolloverAt = self._compute_rollover(time.time())
         self.currentFileName = self._compute_fn()
         BaseRotatingHandler.__init__(self, filename, 'a', encoding, delay)
+        self.pid = os.getpid()
+        _handlers.add(self)
+
+    @staticmethod
+    def _compute_rollover(now: float) -> float:
+        """Timestamp of the next local midnight, so that only a comparison of timestamps is done for each record."""
+        t = time.localtime(now)
+        return time.mktime((t.tm_year, t.tm_mon, t.tm_mday + 1, 0, 0, 0, 0, 0, -1))  # normalized by `mktime`, DST aware
 
     def shouldRollover(self, record):
-        if self.currentFileName != self._compute_fn():
+        if record.created >= self.rolloverAt:
             return True
+        if self.max_bytes > 0 and self.stream is not None:
+            # notice: the position of the underlying binary buffer is cached, unlike `TextIOWrapper.tell()`
+            return getattr(self.stream, 'buffer', self.stream).tell() >= self.max_bytes
         return False
 
     def doRollover(self):
+        path_closed = self.currentFileName if self.stream else None
         if self.stream:
             self.stream.close()
             self.stream = None
+
+        now = time.time()
+        if now >= self.rolloverAt:  # a new day
+            self.rolloverAt = self._compute_rollover(now)
+            self.index = 0
+        else:  # reached `max_bytes`
+            self.index += 1
         self.currentFileName = self._compute_fn()
+        while self.max_bytes > 0 and os.path.exists(self.currentFileName) and os.path.getsize(self.currentFileName) >= self.max_bytes:
+            self.index += 1  # e.g. restarted process with the same pid, continue with the next index
+            self.currentFileName = self._compute_fn()
+
         if not self.delay:
             self.stream = self._open()
+        if self.compress and path_closed is not None:
+            threading.Thread(target=_gzip_file, args=(path_closed,), name='aloha-log-gzip', daemon=True).start()
 
     def _compute_fn(self):
         return self.baseFilename.replace(".log", "") + "_" \
                + time.strftime(self.suffix, time.localtime()) \
+               + ('.%d' % self.index if self.index > 0 else '') \
                + '.log'
 
     def _open(self):
         return open(self.currentFileName, mode=self.mode, encoding=self.encoding)
 
+    def _after_fork_in_child(self):
+        """Write to the files of this process, the inherited stream is flushed as each record is flushed once written."""
+        pid_parent, self.pid = self.pid, os.getpid()
+        tag_parent = '_p%s' % pid_parent
+        if tag_parent not in os.path.basename(self.baseFilename):  # shared by processes, keep writing to it
+            return
+        self.acquire()
+        try:
+            folder, name = os.path.split(self.baseFilename)
+            self.baseFilename = os.path.join(folder, name.replace(tag_parent, '_p%s' % self.pid))
+            self.index = 0
+            self.currentFileName = self._compute_fn()
+            if self.stream is not None:
+                self.stream.close()  # notice: closes the file descriptor of this process only
+                self.stream = self._open()
+        finally:
+            self.release()
+
     def close(self):
         """Closes the stream."""
         self.acquire()
@@ -57,3 +118,27 @@ class MultiProcessSafeDailyRotatingFileHandler(BaseRotatingHandler):
                 StreamHandler.close(self)
         finally:
             self.release()
+
+
+def _gzip_file(path: str) -> None:
+    """Compress the file to `{path}.gz` and remove it."""
+    path_tmp = '%s.%s.%s.gz.tmp' % (path, os.getpid(), threading.get_ident())  # unique, never shared by writers
+    try:
+        with open(path, 'rb') as f_in, gzip.open(path_tmp, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.replace(path_tmp, path + '.gz')
+        os.remove(path)
+    except OSError:  # e.g. removed by others, keep the file uncompressed
+        try:
+            os.remove(path_tmp)
+        except OSError:
+            pass
+
+
+def _after_fork_in_child():
+    for handler in list(_handlers):
+        handler._after_fork_in_child()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -1,21 +1,54 @@
+import atexit
 import logging
 import os
 import socket
 from os.path import join as pjoin
 
+from .async_handler import BatchingQueueListener, BoundedQueueHandler
 from .handler import MultiProcessSafeDailyRotatingFileHandler
+from .sampling import RateLimitFilter
+from .structured import ContextFilter, JsonFormatter
+
+
+def get_log_async_config() -> dict:
+    """Read the settings of asynchronous logging from config, e.g.:
+
+    deploy = {
+      log_async = {
+        enabled = true     # records are queued by the logging thread, and written in batches by a background thread
+        queue_size = 10000
+        policy = drop      # drop | block: when the queue is full, drop the record, or wait up to `block_timeout` seconds
+        block_timeout = 1.0
+        batch_size = 256   # max records written (and flushed) at once
+      }
+    }
+    """
+    from ..settings import SETTINGS
+    cfg = SETTINGS.config.get('deploy', {}).get('log_async', None) or {}
+    return {
+        'enabled': bool(cfg.get('enabled', False)),
+        'queue_size': int(cfg.get('queue_size', 10000)),
+        'policy': cfg.get('policy', 'drop'),
+        'block_timeout': float(cfg.get('block_timeout', 1.0)),
+        'batch_size': int(cfg.get('batch_size', 256)),
+    }
 
 
 def setup_logger(logger: logging.Logger, level: int = logging.DEBUG, logger_name: str = None, module: str = None, formatter_str: str = None):
     if not logger.handlers:
-        formatter = logging.Formatter(formatter_str or '%(levelname)s> %(asctime)s> %(module)s:%(lineno)s> %(message)s')
+        from ..settings import SETTINGS
+        config_deploy = SETTINGS.config.get('deploy', {})
+        log_format = config_deploy.get('log_format', 'text')  # text | json
 
         folder = os.environ.get('DIR_LOG', 'logs')
         os.makedirs(folder, exist_ok=True)
 
         if module is None:
-            from ..settings import SETTINGS
             module = SETTINGS.config.get('APP_MODULE') or os.environ.get('APP_MODULE', 'default')
+        if log_format == 'json':  # one JSON object per line, with the request context
+            formatter = JsonFormatter(app=module)
+        else:
+            formatter = logging.Formatter(formatter_str or '%(levelname)s> %(asctime)s> %(module)s:%(lineno)s> %(message)s')
 
         # if logger_name is not None and len(logger_name) > 0:
         #     module = '%s_%s' % (logger_name, module)
@@ -23,13 +56,32 @@ def setup_logger(logger: logging.Logger, level: int = logging.DEBUG, logger_name
         path_file = [module, socket.gethostname(), 'p%s' % os.getpid()]  # module, hostname, pid
         path_file = '_'.join(str(i) for i in path_file if i is not None)
         path_file = pjoin(folder, '%s.log' % path_file)
-        file_handler = MultiProcessSafeDailyRotatingFileHandler(path_file)
+        file_handler = MultiProcessSafeDailyRotatingFileHandler(
+            path_file,
+            max_bytes=int(config_deploy.get('log_max_bytes', 0)),  # also rotate by size, e.g. 104857600 for 100MB
+            compress=bool(config_deploy.get('log_compress', False)),  # gzip rotated files
+        )
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
 
         stream_handler = logging.StreamHandler()
         stream_handler.setFormatter(formatter)
-        logger.addHandler(stream_handler)
+
+        config_async = get_log_async_config()
+        if config_async['enabled']:  # the handlers are called by the listener thread, not by the logging thread
+            queue_handler = BoundedQueueHandler(
+                maxsize=config_async['queue_size'], policy=config_async['policy'], block_timeout=config_async['block_timeout']
+            )
+            listener = BatchingQueueListener(queue_handler, [file_handler, stream_handler], batch_size=config_async['batch_size'])
+            listener.start()
+            atexit.register(listener.stop)
+            handlers = [queue_handler]
+        else:
+            handlers = [file_handler, stream_handler]
+        for handler in handlers:
+            handler.addFilter(ContextFilter())  # the request context is read in the thread calling the logger
+            logger.addHandler(handler)
+        # sample / rate limit records per call site, see `RateLimitFilter` for the keys of `deploy.log_limits`
+        logger.addFilter(RateLimitFilter.from_config(config_deploy.get('log_limits', None)))
 
         logger.setLevel(level)
 
@@ -0,0 +1,96 @@
+__all__ = ('RateLimitFilter', 'DEFAULT_LIMITS')
+
+import logging
+import random
+import threading
+import time
+
+# limits applied unless overridden in `deploy.log_limits.sites`; empty, so no record is dropped unless configured.
+# keys set by `extra={'log_limit': key}` in aloha:
+# - request_dump: request arguments / body dumped by API handlers
+# - kafka_message: each message produced or received by `KafkaOperator`
+DEFAULT_LIMITS = {}
+
+
+class _Site:
+    __slots__ = ('ratio', 'rate', 'burst', 'tokens', 'updated_at', 'n_suppressed')
+
+    def __init__(self, ratio: float = 1.0, rate: float = 0, burst: float = 0):
+        self.ratio, self.rate = ratio, rate
+        self.burst = max(burst, rate, 1)
+        self.tokens, self.updated_at = self.burst, time.monotonic()
+        self.n_suppressed = 0
+
+
+class RateLimitFilter(logging.Filter):
+    """Sample and rate limit (token bucket) log records per call site, records above `max_level` are never suppressed.
+    Nothing is limited by default: all records pass unless `ratio`, `rate` or `sites` is set (see `deploy.log_limits`).
+
+    A call site is keyed by `extra={'log_limit': key}` of the log call, or else by `{module}:{lineno}`;
+    the limits of a site are looked up in `sites` by the key, then by module and logger name, or else the defaults.
+    The number of records suppressed at a site is appended to the next record passing there.
+    """
+
+    def __init__(self, ratio: float = 1.0, rate: float = 0, burst: float = 0, max_level: int = logging.INFO, sites: dict = None):
+        """
+        :param ratio: ratio of records kept at each call site, e.g. 0.01 to keep 1%
+        :param rate: max records per second at each call site, 0 for no limit
+        :param burst: max records passing at once after idle, default to `rate`
+        :param max_level: records at higher level (e.g. WARNING, ERROR) are always kept
+        :param sites: limits of specific call sites, e.g. `{'kafka': {'rate': 1}, 'v2:75': {'ratio': 0.1}}`
+        """
+        super().__init__()
+        self.default = {'ratio': float(ratio), 'rate': float(rate), 'burst': float(burst)}
+        self.max_level = max_level
+        self.sites_config = {**DEFAULT_LIMITS, **(sites or {})}
+        self.unlimited = ratio >= 1 and rate <= 0 and not self.sites_config  # fast path: no record is limited
+        self._sites: dict = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'RateLimitFilter':
+        """Create from config like `deploy.log_limits`."""
+        config = config or {}
+        max_level = config.get('max_level', 'INFO')
+        if isinstance(max_level, str):
+            max_level = getattr(logging, max_level.upper(), logging.INFO)
+        return cls(
+            ratio=float(config.get('ratio', 1.0)), rate=float(config.get('rate', 0)), burst=float(config.get('burst', 0)),
+            max_level=max_level, sites=dict(config.get('sites', None) or {}),
+        )
+
+    def _get_site(self, key, record) -> _Site:
+        site = self._sites.get(key)
+        if site is None:
+            cfg = self.sites_config.get(key) or self.sites_config.get(record.module) or self.sites_config.get(record.name)
+            cfg = {**self.default, **(cfg or {})}
+            site = self._sites[key] = _Site(float(cfg['ratio']), float(cfg['rate']), float(cfg['burst']))
+        return site
+
+    def filter(self, record) -> bool:
+        if record.levelno > self.max_level or self.unlimited:
+            return True
+        key = getattr(record, 'log_limit', None)
+        if key is None:
+            key = '%s:%s' % (record.module, record.lineno)
+
+        with self._lock:  # notice: loggers are called from the event loop and the thread pools
+            site = self._get_site(key, record)
+            keep = site.ratio >= 1 or random.random() < site.ratio
+            if keep and site.rate > 0:
+                now = time.monotonic()
+                site.tokens = min(site.burst, site.tokens + (now - site.updated_at) * site.rate)
+                site.updated_at = now
+                if site.tokens >= 1:
+                    site.tokens -= 1
+                else:
+                    keep = False
+            if not keep:
+                site.n_suppressed += 1
+                return False
+            n_suppressed, site.n_suppressed = site.n_suppressed, 0
+
+        if n_suppressed > 0:
+            record.msg = '%s (%d similar record(s) suppressed)' % (record.getMessage(), n_suppressed)
+            record.args = None
+        return True
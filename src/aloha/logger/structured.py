@@ -0,0 +1,97 @@
+__all__ = ('JsonFormatter', 'ContextFilter', 'Lazy', 'set_log_context', 'reset_log_context', 'get_log_context')
+
+import json
+import logging
+import os
+import socket
+import time
+from contextvars import ContextVar
+
+# context of the request being handled, propagated to coroutines and (with `run_in_executor`) to the thread pool
+_request_id: ContextVar = ContextVar('aloha_request_id', default=None)
+_route: ContextVar = ContextVar('aloha_route', default=None)
+
+
+def set_log_context(request_id: str = None, route: str = None) -> tuple:
+    """Set the request context attached to log records, return tokens for `reset_log_context`."""
+    return _request_id.set(request_id), _route.set(route)
+
+
+def reset_log_context(tokens: tuple) -> None:
+    _request_id.reset(tokens[0])
+    _route.reset(tokens[1])
+
+
+def get_log_context() -> dict:
+    return {'request_id': _request_id.get(), 'route': _route.get()}
+
+
+class Lazy:
+    """Argument of a log call evaluated only when the record is emitted, e.g.:
+    `LOG.debug('Request: %s', Lazy(json.dumps, kwargs))` does not serialize `kwargs` if DEBUG is not enabled.
+    """
+    __slots__ = ('func', 'args', 'kwargs')
+
+    def __init__(self, func, *args, **kwargs):
+        self.func, self.args, self.kwargs = func, args, kwargs
+
+    def __str__(self):
+        return str(self.func(*self.args, **self.kwargs))
+
+    __repr__ = __str__
+
+
+class ContextFilter(logging.Filter):
+    """Attach the request context to the record as `request_id` and `route`, in the thread calling the logger,
+    so the context is kept when the record is formatted in another thread (see `deploy.log_async`).
+    """
+
+    def filter(self, record) -> bool:
+        record.request_id = _request_id.get()
+        record.route = _route.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format each record as one JSON object per line, with the request context (`request_id`, `route`) and the pid.
+    The request context is set on the record by `ContextFilter`.
+    Fields constant in the process (pid, host, app) are serialized once, and again only after fork.
+    """
+
+    def __init__(self, app: str = None, **kwargs):
+        super().__init__(**kwargs)
+        self.app = app
+        self._pid = None
+        self._constant = None
+
+    def _constant_fields(self) -> str:
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._constant = json.dumps({'pid': pid, 'host': socket.gethostname(), 'app': self.app}, ensure_ascii=False)[1:-1]
+        return self._constant
+
+    def formatTime(self, record, datefmt=None):
+        return '%s.%03d' % (time.strftime('%Y-%m-%dT%H:%M:%S', self.converter(record.created)), record.msecs)
+
+    def format(self, record) -> str:
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'line': record.lineno,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id is not None:
+            data['request_id'] = request_id
+            data['route'] = getattr(record, 'route', None)
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc_info'] = record.exc_text
+        if record.stack_info:
+            data['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)[:-1] + ', ' + self._constant_fields() + '}'
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# Compile the HOCON config files into a snapshot, which is loaded at startup instead of parsing the files again.
+
+import argparse
+import time
+
+from ..config import cache, hocon, paths
+
+
+def compile_config() -> str:
+    t = time.time()
+    base_dir = paths.get_config_dir()
+    config_files = paths.get_config_files()
+    fingerprint = cache.compute_fingerprint(config_files, base_dir)
+    config = hocon.load_plain_config_from_hocon_files(config_files, base_dir=base_dir)
+    path = cache.save_snapshot(config, config_files, base_dir, fingerprint=fingerprint)
+    print('Config compiled to [%s] from %d source file(s) in %.3f seconds.' % (path, len(fingerprint['files']), time.time() - t))
+    return path
+
+
+def main():
+    p = argparse.ArgumentParser(prog='aloha config', description='Manage the config of the current project.')
+    p.add_argument('action', choices=('compile',), help='compile: resolve the config files and save the snapshot')
+    args = p.parse_args()
+
+    if args.action == 'compile':
+        compile_config()
+
+
+if __name__ == '__main__':
+    """aloha config compile"""
+    main()
@@ -1,33 +1,42 @@
-__all__ = ('APIHandler', 'APICaller',)
+__all__ = ('APIHandler', 'APICaller', 'AsyncAPICaller',)
 
-import json
 import logging
 from abc import ABC
 
-from ..http import AbstractApiClient, AbstractApiHandler
+from ..http import AbstractApiClient, AbstractApiHandler, AsyncApiClient, ExecutorBusyError
 
 
 class APIHandler(AbstractApiHandler, ABC):
     MAP_ERROR_INFO = {
-        'BAD_REQUEST': {'code': '5101', 'message': ['Bad request: fail to parse body as JSON object!']}
+        'BAD_REQUEST': {'code': '5101', 'message': ['Bad request: fail to parse body as JSON object!']},
+        'SERVER_BUSY': {'code': '5103', 'message': ['Server busy: too many pending requests, please retry later!']},
     }
 
     async def post(self, *args, **kwargs):
         req_body = self.request_body
+        if self._finished:  # request already finished as BAD_REQUEST
+            return
 
         if req_body is not None:  # body_arguments
             kwargs.update(req_body)
 
         resp = dict(code=5200, message=['success'])
         try:
-            result = self.response(*args, **kwargs)  # this call may throw TypeError when argument missing
-            resp['data'] = result
+            result = await self.call_response(*args, **kwargs)  # this call may throw TypeError when argument missing
+        except ExecutorBusyError:
+            self.set_status(503)
+            return self.finish(self.MAP_ERROR_INFO['SERVER_BUSY'])
         except Exception as e:
             if self.LOG.level == logging.DEBUG:
                 self.LOG.error(e, exc_info=True)
             return self.finish({'code': 5201, 'message': [repr(e)]})
 
-        resp = json.dumps(resp, ensure_ascii=False, default=str, separators=(',', ':'))
+        if self.is_stream_result(result):  # generators, DataFrame, etc. are streamed as `data` in chunks
+            return await self.finish_stream(result, envelope=resp)
+
+        resp['data'] = result
+        self.api_code = resp['code']
+        resp = self.dumps_response(resp)
         return self.finish(resp)
 
 
@@ -35,3 +44,7 @@ class APICaller(AbstractApiClient):
     def wrap_request_data(self, data: dict) -> dict:
         assert isinstance(data, dict), "Data object must be a dict!"
         return data
+
+
+class AsyncAPICaller(AsyncApiClient, APICaller):
+    """Async version of `APICaller`, `await caller.call(api_url, data)` without blocking the event loop."""
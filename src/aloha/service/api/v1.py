@@ -1,58 +1,120 @@
-__all__ = ('APIHandler', 'APICaller', 'sign_data', 'sign_check')
+__all__ = ('APIHandler', 'APICaller', 'AsyncAPICaller', 'sign_data', 'sign_check')
 
-import json
 import logging
 import uuid
 from abc import ABC
+from typing import Optional
 
-from ..http import AbstractApiClient, AbstractApiHandler
-from ...encrypt.hash import get_md5_of_str, get_sha256_of_str
+from ..http import AbstractApiClient, AbstractApiHandler, AsyncApiClient, ExecutorBusyError
+from ..http.replay import ReplayCacheFullError, ReplayGuard
+from ...encrypt import sign as signer
 from ...settings import SETTINGS
 
 APP_ID_KEYS = SETTINGS.config.get('APP_ID_KEYS', {})
 APP_OPTIONS = SETTINGS.config.get('APP_OPTIONS', {})
-FUNC_SIGN_CHECK = {'md5': get_md5_of_str, 'sha256': get_sha256_of_str}
-func_sign_check_default = FUNC_SIGN_CHECK.get(APP_OPTIONS.get('sign_method', 'md5'))
+sign_method_default = APP_OPTIONS.get('sign_method', 'md5')  # one of `aloha.encrypt.sign.SIGN_METHODS`
+# reject requests reusing a `salt_uuid` within a time window, None if `APP_OPTIONS.replay_check.enabled` is not set
+REPLAY_GUARD = ReplayGuard.from_config(APP_OPTIONS.get('replay_check'))
+
+
+@SETTINGS.subscribe('APP_ID_KEYS')
+def _on_app_id_keys_changed(value):
+    global APP_ID_KEYS
+    APP_ID_KEYS = value or {}
+    APICaller.APP_ID_KEYS = APP_ID_KEYS
+
+
+@SETTINGS.subscribe('APP_OPTIONS')
+def _on_app_options_changed(value):
+    global APP_OPTIONS, sign_method_default, REPLAY_GUARD
+    replay_check_old = APP_OPTIONS.get('replay_check')
+    APP_OPTIONS = value or {}
+    sign_method_default = APP_OPTIONS.get('sign_method', 'md5')
+    if APP_OPTIONS.get('replay_check') != replay_check_old:  # otherwise keep the seen salts
+        REPLAY_GUARD = ReplayGuard.from_config(APP_OPTIONS.get('replay_check'))
 
 
 class APIHandler(AbstractApiHandler, ABC):
     MAP_ERROR_INFO = {
         'BAD_REQUEST': {'code': '5101', 'message': ['Bad request: fail to parse body as JSON object!']},
         'MISSING_ARGS': {'code': '5102', 'message': ['Required argument field(s) missing...']},
+        'SERVER_BUSY': {'code': '5103', 'message': ['Server busy: too many pending requests, please retry later!']},
         'SIGN_CHECK_FAIL': {'code': '5104', 'message': ['Invalid sign, sign check failed!']},
+        'REPLAY_REJECTED': {'code': '5105', 'message': ['Replayed request: salt_uuid has been used!']},
     }
 
     async def post(self):
         body_arguments = self.request_body
-
-        try:
-            salt_uuid = body_arguments.pop('salt_uuid')
-            app_id = body_arguments.pop('app_id')
-            sign = body_arguments.pop('sign')
-            data = body_arguments.pop('data')
-        except KeyError:  # cannot find default key from parsed body
+        if self._finished:  # request already finished as BAD_REQUEST
+            return
+
+        try:  # notice: the parsed body is cached for the request, so read the fields without popping them
+            salt_uuid = body_arguments['salt_uuid']
+            app_id = body_arguments['app_id']
+            sign = body_arguments['sign']
+            data = body_arguments['data']
+        except (KeyError, TypeError):  # cannot find default key from parsed body
             return self.finish(self.MAP_ERROR_INFO['MISSING_ARGS'])
 
-        is_valid_req = sign_check(salt_uuid=salt_uuid, app_id=app_id, sign=sign, data=data)  # , sign_method='sha256'
-        if not is_valid_req:
-            return self.finish(self.MAP_ERROR_INFO['SIGN_CHECK_FAIL'])
+        with self.timed('auth'):
+            error = await self.check_request(salt_uuid=salt_uuid, app_id=app_id, sign=sign, data=data)
+        if error is not None:
+            if error == 'SERVER_BUSY':
+                self.set_status(503)
+            return self.finish(self.MAP_ERROR_INFO[error])
 
         resp = dict(code=5200, message=['success'])
         try:
-            result = self.response(**data)  # this call may throw TypeError when argument missing
-            resp['data'] = result
-            resp['salt_uuid'] = salt_uuid
+            result = await self.call_response(**data)  # this call may throw TypeError when argument missing
+        except ExecutorBusyError:  # not admitted, release the salt so the client can retry with it
+            await self.release_request(salt_uuid=salt_uuid, app_id=app_id)
+            self.set_status(503)
+            return self.finish(self.MAP_ERROR_INFO['SERVER_BUSY'])
         except Exception as e:
             if self.LOG.level == logging.DEBUG:
                 self.LOG.error(e, exc_info=True)
             return self.finish({'code': 5201, 'message': [repr(e)]})
 
-        resp = json.dumps(resp, ensure_ascii=False, default=str, separators=(',', ':'))
+        if self.is_stream_result(result):  # generators, DataFrame, etc. are streamed as `data` in chunks
+            resp['salt_uuid'] = salt_uuid
+            return await self.finish_stream(result, envelope=resp)
+
+        resp['data'] = result
+        resp['salt_uuid'] = salt_uuid
+        self.api_code = resp['code']
+        resp = self.dumps_response(resp)
         return self.finish(resp)
 
+    @staticmethod
+    async def check_request(salt_uuid: str, app_id: str, sign: str, data) -> Optional[str]:
+        """Check the sign and replay of the request, return the key of error in `MAP_ERROR_INFO`, or None if it is valid."""
+        nonce = '%s:%s' % (app_id, salt_uuid)
+        if REPLAY_GUARD is not None and REPLAY_GUARD.seen(nonce):  # cheap in-process lookup before checking the sign
+            return 'REPLAY_REJECTED'
+
+        is_valid_req = sign_check(salt_uuid=salt_uuid, app_id=app_id, sign=sign, data=data)  # , sign_method='sha256'
+        if not is_valid_req:
+            return 'SIGN_CHECK_FAIL'
+
+        # only record the salt of valid requests, so forged ones cannot fill up the cache
+        if REPLAY_GUARD is not None:
+            try:
+                is_new_salt = await REPLAY_GUARD.add(nonce)
+            except (ReplayCacheFullError, ExecutorBusyError):
+                return 'SERVER_BUSY'
+            if not is_new_salt:
+                return 'REPLAY_REJECTED'
+        return None
+
+    @staticmethod
+    async def release_request(salt_uuid: str, app_id: str) -> None:
+        """Forget the salt recorded by `check_request`, for requests rejected afterwards as the server is busy (503)."""
+        if REPLAY_GUARD is not None:
+            await REPLAY_GUARD.discard('%s:%s' % (app_id, salt_uuid))
+
 
 class APICaller(AbstractApiClient):
-    APP_ID_KEYS = AbstractApiClient.config.get('APP_ID_KEYS', {})
+    APP_ID_KEYS = APP_ID_KEYS  # updated when the config is reloaded
 
     def wrap_request_data(
             self, data, app_id: str = None, app_key: str = None, salt_uuid: str = None, sign: str = None, sign_method: str = None
@@ -77,45 +139,32 @@ class APICaller(AbstractApiClient):
         }
 
 
-def sign_data(salt_uuid: str, app_id: str, app_key: str, data, sign_method: str = None):
-    data_str = str(json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')))
-    public_key = app_id + salt_uuid + data_str + app_key
+class AsyncAPICaller(AsyncApiClient, APICaller):
+    """Async version of `APICaller`, `await caller.call(api_url, data)` without blocking the event loop."""
 
-    func_sign_check = func_sign_check_default if sign_method is None else FUNC_SIGN_CHECK.get(sign_method)
-    if func_sign_check is None:
-        raise ValueError('Invalid `sign_method`: %s' % sign_method)
-    sign = func_sign_check(public_key)
-    return sign
+
+def sign_data(salt_uuid: str, app_id: str, app_key: str, data, sign_method: str = None):
+    return signer.get_sign(
+        app_id=app_id, salt_uuid=salt_uuid, app_key=app_key, data=data, sign_method=sign_method or sign_method_default
+    )
 
 
 def sign_check(salt_uuid: str, app_id: str, sign: str, data, sign_method: str = None, date_time=None):
     """Sign Validation
     :param salt_uuid: Universal Unified ID for 1) Signature, 2) Log tracing
     :param app_id: APP ID
-    :param sign: sing = hash(app_id + salt_uuid + data + app_key)
-    :param data: data object, will be serialized to JSON string
+    :param sign: sing = hash(app_id + salt_uuid + data + app_key), or hmac(app_key, app_id + salt_uuid + data) for hmac methods
+    :param data: data object, will be serialized to canonical JSON string once
     :param date_time: not used for now
-    :param sign_method: Sign method, one of the following: md5, sha256
+    :param sign_method: Sign method, one of the following: md5, sha256, hmac-md5, hmac-sha256
     :return: If the signature passed validation
     """
-
-    func_sign_check = func_sign_check_default if sign_method is None else FUNC_SIGN_CHECK.get(sign_method)
-    if func_sign_check is None:
+    sign_method = sign_method or sign_method_default
+    if sign_method not in signer.SIGN_METHODS:
         raise ValueError('Invalid `sign_method`: %s' % sign_method)
 
     app_key = APP_ID_KEYS.get(app_id)
     if app_key is None:  # APP_ID not in the dict, unknown APP_ID
         return False
 
-    data_str = str(json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')))
-
-    # --> Compatible with older version API
-    right_sign = func_sign_check(app_id + salt_uuid + app_key)
-    if sign == right_sign:
-        return True
-    # <--
-
-    public_key = str(json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')))
-    public_key = app_id + salt_uuid + public_key + app_key
-    right_sign = func_sign_check(public_key)
-    return sign == right_sign
+    return signer.check_sign(sign, app_id=app_id, salt_uuid=salt_uuid, app_key=app_key, data=data, sign_method=sign_method)
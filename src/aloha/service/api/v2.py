@@ -1,14 +1,60 @@
-__all__ = ('APIHandler', 'APICaller',)
+__all__ = ('APIHandler', 'APICaller', 'AsyncAPICaller',)
 
+import hashlib
 import json
-import logging
+import threading
+import time
 from abc import ABC
 from datetime import datetime, timedelta
 from typing import Optional, Awaitable
 
-from ..http import AbstractApiClient, AbstractApiHandler
+from ..http import AbstractApiClient, AbstractApiHandler, AsyncApiClient, ExecutorBusyError
 from ...encrypt import jwt
+from ...logger.structured import Lazy
 from ...settings import SETTINGS
+from ...util.cache import TTLCache
+from ...util.random import random_ratio
+
+
+def _new_token_cache(options: dict) -> TTLCache:
+    return TTLCache(maxsize=int(options.get('token_cache_size', 10000)), ttl=float(options.get('token_cache_ttl', 300)))
+
+
+_APP_OPTIONS = SETTINGS.config.get('APP_OPTIONS', {})
+# validated access token (by sha256 hash) -> claims, entries never live longer than the `exp` of the token
+TOKEN_CACHE = _new_token_cache(_APP_OPTIONS)
+_SECRET_KEY = SETTINGS.config.get('APP_SECRET_KEY')  # updated when the config is reloaded, see `_on_app_secret_key_changed`
+
+
+def decode_access_token(access_token: str):
+    """Decode and validate the access token, return the claims (dict) or error message (str) if it is invalid.
+    Validated tokens are cached, so clients reusing the same token are not decoded again.
+    """
+    key = hashlib.sha256(access_token.encode()).digest()
+    claims = TOKEN_CACHE.get(key)
+    if claims is not None:
+        return claims
+
+    secret_key = _SECRET_KEY
+    # options = None
+    # TODO: if not validate expiration
+    options = {"verify_exp": False}
+    claims = jwt.decode(secret_key, access_token, options=options)
+    if isinstance(claims, dict):
+        ttl = TOKEN_CACHE.ttl
+        if 'exp' in claims:
+            ttl = min(ttl, float(claims['exp']) - time.time())
+        if ttl > 0:
+            TOKEN_CACHE.set(key, claims, ttl=ttl)
+    return claims
+
+
+def _dumps_truncated(obj, limit: int) -> str:
+    return json.dumps(obj, ensure_ascii=False)[:limit]
+
+
+def _truncated(body: bytes, limit: int) -> bytes:
+    return body[:limit]
 
 
 class APIHandler(AbstractApiHandler, ABC):
@@ -19,11 +65,8 @@ class APIHandler(AbstractApiHandler, ABC):
                 'msg': 'Invalid Access-Token in request header!'
             })
         else:
-            secret_key = SETTINGS.config['APP_SECRET_KEY']
-            # options = None
-            # TODO: if not validate expiration
-            options = {"verify_exp": False}
-            access_token = jwt.decode(secret_key, access_token, options=options)
+            with self.timed('auth'):
+                access_token = decode_access_token(access_token)
             if not isinstance(access_token, dict):
                 self.LOG.error('Invalid Access-Token found in request for [%s]: %s' % (
                     str(self.request.full_url()), access_token
@@ -35,54 +78,71 @@ class APIHandler(AbstractApiHandler, ABC):
 
     async def post(self, *args, **kwargs):
         body_arguments = self.request_body
-        kwargs.update(body_arguments)
+        if self._finished:  # request already finished as BAD_REQUEST
+            return
+        kwargs.update(body_arguments or {})
         try:
-            if self.LOG.level == logging.DEBUG:
-                s_kwargs = json.dumps(kwargs, ensure_ascii=False)
-                self.LOG.debug('POST Request [%s]: %s' % (self.request_id, s_kwargs[:1000]))
+            # lazily serialized, only if DEBUG is enabled
+            self.LOG.debug(
+                'POST Request [%s]: %s', self.request_id, Lazy(_dumps_truncated, kwargs, 1000), extra={'log_limit': 'request_dump'}
+            )
             self.api_args, self.api_kwargs = args or (), kwargs or {}
-            resp = self.response(*self.api_args, **self.api_kwargs)  # this call may throw TypeError when argument missing
+            resp = await self.call_response(*self.api_args, **self.api_kwargs)  # this call may throw TypeError when argument missing
+        except ExecutorBusyError:
+            self.set_status(503)
+            return self.finish(self.MAP_ERROR_INFO['SERVER_BUSY'])
         except Exception as e:
             self.LOG.error(e, exc_info=True)
-            self.LOG.info('POST Request [%s]: %s' % (self.request_id, self.request.body))
+            self.LOG.info(
+                'POST Request [%s]: %s', self.request_id, Lazy(_truncated, self.request.body, 1000), extra={'log_limit': 'request_dump'}
+            )
             return self.finish({'status': 'error', 'message': [str(e)]})
 
+        if self.is_stream_result(resp):  # generators, DataFrame, etc. are streamed in chunks
+            return await self.finish_stream(resp)
         if isinstance(resp, (dict, list)):
-            resp = json.dumps(resp, ensure_ascii=False, default=str, separators=(',', ':'))
+            resp = self.dumps_response(resp)
         return self.finish(resp)
 
     async def get(self, *args, **kwargs):
         query_arguments = self.request_param
         kwargs.update(query_arguments)
         try:
-            self.LOG.debug('GET Request [%s]: %s' % (self.request_id, kwargs))
+            self.LOG.debug('GET Request [%s]: %s', self.request_id, kwargs, extra={'log_limit': 'request_dump'})
             self.api_args, self.api_kwargs = args or (), kwargs or {}
-            resp = self.response(*self.api_args, **self.api_kwargs)  # this call may throw TypeError when argument missing
+            resp = await self.call_response(*self.api_args, **self.api_kwargs)  # this call may throw TypeError when argument missing
+        except ExecutorBusyError:
+            self.set_status(503)
+            return self.finish(self.MAP_ERROR_INFO['SERVER_BUSY'])
         except Exception as e:
             self.LOG.error(e, exc_info=True)
-            self.LOG.info('GET Request [%s]: %s' % (self.request_id, kwargs))
+            self.LOG.info('GET Request [%s]: %s', self.request_id, kwargs, extra={'log_limit': 'request_dump'})
             return self.finish({'status': 'error', 'message': [repr(e)]})
 
+        if self.is_stream_result(resp):  # generators, DataFrame, etc. are streamed in chunks
+            return await self.finish_stream(resp)
         if isinstance(resp, (dict, list)):
-            resp = json.dumps(resp, ensure_ascii=False, default=str, separators=(',', ':'))
+            resp = self.dumps_response(resp)
         return self.finish(resp)
 
 
 class APICaller(AbstractApiClient):
+    # updated when the config is reloaded, see `_on_app_secret_key_changed`
     APP_ID_KEYS = AbstractApiClient.config.get('APP_ID_KEYS', {})
     APP_SECRET_KEY = AbstractApiClient.config.get('APP_SECRET_KEY')
+    TOKEN_LIFETIME: timedelta = timedelta(days=1)
+    # tokens are refreshed when less than this ratio of lifetime left, plus a random jitter up to the same ratio
+    TOKEN_REFRESH_AHEAD_RATIO: float = 0.1
+
+    _tokens: dict = {}  # (app_id, secret_key) -> (access_token, refresh_at), shared by all callers in the process
+    _tokens_lock = threading.Lock()
 
     def wrap_request_data(self, data: dict) -> dict:
         assert isinstance(data, dict), "Data object must be a dict!"
         return data
 
-    def get_headers(self, app_id: str = None, app_key: str = None) -> dict:
-        if app_id is None:
-            # if len(APP_ID_KEYS) != 1:
-            #     raise RuntimeError('Please specify 1 and only 1 in APP_ID_KEYS in configurations!')
-            app_id = list(self.APP_ID_KEYS.keys())[0]
-
-        expire_time = datetime.now() + timedelta(days=1)
+    def _new_access_token(self, app_id: str) -> tuple:
+        expire_time = datetime.now() + self.TOKEN_LIFETIME
 
         access_token = jwt.encode(
             secret_key=self.APP_SECRET_KEY,
@@ -92,6 +152,53 @@ class APICaller(AbstractApiClient):
             }
         )
 
+        lifetime = self.TOKEN_LIFETIME.total_seconds()
+        refresh_ahead = lifetime * self.TOKEN_REFRESH_AHEAD_RATIO * (1 + random_ratio())  # jitter avoids refreshing all at once
+        return access_token, expire_time.timestamp() - refresh_ahead
+
+    def get_access_token(self, app_id: str) -> str:
+        """Get the cached access token of given app_id, a new one is signed only when it is about to expire."""
+        key = (app_id, self.APP_SECRET_KEY)
+        item = self._tokens.get(key)
+        if item is None or item[1] <= time.time():
+            with self._tokens_lock:  # double-checked, so only one thread signs a new token
+                item = self._tokens.get(key)
+                if item is None or item[1] <= time.time():
+                    item = self._new_access_token(app_id)
+                    self._tokens[key] = item
+        return item[0]
+
+    def get_headers(self, app_id: str = None, app_key: str = None) -> dict:
+        if app_id is None:
+            # if len(APP_ID_KEYS) != 1:
+            #     raise RuntimeError('Please specify 1 and only 1 in APP_ID_KEYS in configurations!')
+            app_id = list(self.APP_ID_KEYS.keys())[0]
+
         headers = super().get_headers()
-        headers.update({'Access-Token': access_token})
+        headers.update({'Access-Token': self.get_access_token(app_id)})
         return headers
+
+
+class AsyncAPICaller(AsyncApiClient, APICaller):
+    """Async version of `APICaller`, `await caller.call(api_url, data)` without blocking the event loop."""
+
+
+@SETTINGS.subscribe('APP_ID_KEYS')
+def _on_app_id_keys_changed(value):
+    APICaller.APP_ID_KEYS = value or {}
+
+
+@SETTINGS.subscribe('APP_OPTIONS')
+def _on_app_options_changed(value):
+    global _APP_OPTIONS, TOKEN_CACHE
+    options_old, _APP_OPTIONS = _APP_OPTIONS, value or {}
+    if any(_APP_OPTIONS.get(k) != options_old.get(k) for k in ('token_cache_size', 'token_cache_ttl')):
+        TOKEN_CACHE = _new_token_cache(_APP_OPTIONS)  # otherwise keep the validated tokens
+
+
+@SETTINGS.subscribe('APP_SECRET_KEY')
+def _on_app_secret_key_changed(value):
+    global _SECRET_KEY
+    _SECRET_KEY = value
+    APICaller.APP_SECRET_KEY = value  # tokens signed by the old key are refreshed, as the key is part of the cache key
+    TOKEN_CACHE.clear()  # tokens validated by the old key
@@ -1,6 +1,8 @@
 __all__ = ('Application',)
 
 import asyncio
+import os
+import signal
 
 from ..logger import LOG
 
@@ -14,6 +16,7 @@ try:
 except ImportError:
     LOG.info('[uvloop] NOT installed, fallback to asyncio loop! Consider `pip install uvloop`!')
 
+from .supervisor import Supervisor
 from .web import WebApplication
 from ..settings import SETTINGS
 
@@ -23,10 +26,40 @@ from tornado.options import options
 class Application:
     def __init__(self, *args, **kwargs):
         options['log_file_prefix'] = 'access.log'
-        settings = dict(SETTINGS.config)
-        self.web_app = WebApplication(settings)
+        self.shutdown_timeout = float(SETTINGS.config.get('service', {}).get('shutdown_timeout', 30))
+        self._stopping = False
+        self.supervisor = None  # the supervisor in master process, see `start_supervisor`
+        self.supervisor_config = SETTINGS.config.get('service', {}).get('supervisor', {})
+        config_watch = SETTINGS.config.get('service', {}).get('config_watch', None) or {}
+        if config_watch.get('enabled', False):  # reload the config when files changed, in each worker process
+            SETTINGS.watch(float(config_watch.get('interval', 5)))
+        if self.supervisor_config.get('enabled', False):
+            self.web_app = None  # created in each worker process after fork, see `start_supervisor`
+        else:
+            settings = dict(SETTINGS.config)
+            self.web_app = WebApplication(settings)
+
+    @staticmethod
+    def _create_worker_app() -> WebApplication:
+        SETTINGS.notify_in(asyncio.get_event_loop())  # the event loop of the worker, created before the app
+        return WebApplication(dict(SETTINGS.config))
+
+    def start_supervisor(self):
+        self.supervisor = supervisor = Supervisor.from_config(
+            self.supervisor_config,
+            app_factory=self._create_worker_app,
+            port=WebApplication.get_port(SETTINGS.config.get('service', {})),
+            reload_config=SETTINGS.reload,
+        )
+        supervisor.run()
 
     def start(self):
+        if self.web_app is None:
+            return self.start_supervisor()
+
+        if int(SETTINGS.config.get('service', {}).get('num_process', 0)) != 1:
+            LOG.warning('Forking processes without supervisor: SIGTERM to the main process does not drain the workers, '
+                        'consider setting `service.supervisor.enabled`!')
         try:
             self.web_app.start()
             event_loop = asyncio.get_event_loop()
@@ -35,6 +68,9 @@ class Application:
                 # ref: https://github.com/tornadoweb/tornado/issues/2426#issuecomment-400895086
                 raise RuntimeError('Event loop already running before WebApp starts!')
             else:
+                for sig in (signal.SIGTERM, signal.SIGINT):
+                    event_loop.add_signal_handler(sig, self.stop)
+                SETTINGS.notify_in(event_loop)  # apply reloaded config in the event loop, see `SETTINGS.watch`
                 event_loop.run_forever()
         except KeyboardInterrupt:
             pass
@@ -44,6 +80,18 @@ class Application:
             pass
 
     def stop(self):
+        """Graceful shutdown: drain the in-flight requests in `service.shutdown_timeout` seconds, then stop the event loop."""
+        if self.web_app is None:  # supervisor mode, the master holds no web app nor event loop
+            if self.supervisor is not None:
+                os.kill(os.getpid(), signal.SIGTERM)  # handled by the supervisor, which drains and stops the workers
+            return
         event_loop = asyncio.get_event_loop()
-        if event_loop.is_running():
-            event_loop.stop()
+        if event_loop.is_running() and not self._stopping:
+            self._stopping = True
+            asyncio.ensure_future(self._shutdown())
+
+    async def _shutdown(self):
+        try:
+            await self.web_app.shutdown(self.shutdown_timeout)
+        finally:
+            asyncio.get_event_loop().stop()
@@ -1,3 +1,6 @@
+from .async_api_client import AsyncApiClient
 from .base_api_client import AbstractApiClient
 from .base_api_handler import AbstractApiHandler, DefaultHandler404
+from .executor import ExecutorBusyError
 from .plain_http_handler import PlainHttpHandler
+from .streaming import StreamingApiHandler
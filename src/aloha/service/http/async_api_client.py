@@ -0,0 +1,84 @@
+__all__ = ('AsyncApiClient',)
+
+import asyncio
+from abc import ABC
+from typing import Iterable, Optional
+from urllib.parse import urljoin
+
+import httpx
+
+from .async_http import get_async_client
+from .base_api_client import AbstractApiClient
+from .codec import get_codec
+from ...logger import LOG
+from ...times.timeout_asyncio import timeout
+
+
+class AsyncApiClient(AbstractApiClient, ABC):
+    """Async counterpart of `AbstractApiClient`, which shares the same `wrap_request_data` and `get_headers` contracts,
+    so it can be mixed with an API caller of any version, e.g. `class AsyncAPICaller(AsyncApiClient, v2.APICaller)`.
+    Calls are sent by the shared pooled async HTTP client, retried with exponential backoff on connection errors,
+    timeouts and `RETRY_STATUS_FORCELIST`, and limited to `MAX_CONCURRENCY` concurrent calls per client.
+    """
+    MAX_CONCURRENCY: int = 100
+
+    def __init__(self, url_endpoint: str = None, *args, **kwargs):
+        super().__init__(url_endpoint, *args, **kwargs)
+        cfg = self.config.get('service', {}).get('http_client', None) or {}
+        self.total_retries = int(cfg.get('total_retries', 3))
+        self.backoff_factor = float(cfg.get('backoff_factor', 0.1))
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+        return self._semaphore
+
+    async def _post(self, url: str, content: bytes, time_limit: float) -> httpx.Response:
+        client = get_async_client()
+        for attempt in range(self.total_retries + 1):
+            is_last = attempt >= self.total_retries
+            try:
+                async with timeout(time_limit):
+                    resp = await client.post(url, content=content, headers=self.get_headers())
+                if resp.status_code not in self.RETRY_STATUS_FORCELIST or is_last:
+                    return resp
+                LOG.debug('Retrying api call [%s] with status code %s' % (url, resp.status_code))
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                if is_last:
+                    raise e
+                LOG.debug('Retrying api call [%s] on error: %r' % (url, e))
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+
+    async def call(self, api_url: str, data: dict = None, timeout=5, **kwargs):
+        """Trigger API call asynchronously
+        :param api_url: do NOT start with slash (/)
+        :param data: a dictionary which includes the request data
+        :param timeout: timeout in seconds of each attempt
+        :param kwargs: keywords arguments which will be updated to data
+        :return:
+        """
+        body = data or dict()
+        body.update(kwargs)
+        payload = self.wrap_request_data(data=body)
+        LOG.debug('Calling api: %s', api_url)
+        codec = get_codec()
+        async with self.semaphore:
+            resp = await self._post(urljoin(self.url_endpoint, api_url), content=codec.dumps(payload), time_limit=timeout)
+
+        try:
+            ret = codec.loads(resp.content)
+        except Exception as e:
+            LOG.error(str(e))
+            raise RuntimeError(resp.text)
+
+        return ret
+
+    async def call_many(self, calls: Iterable, return_exceptions: bool = False) -> list:
+        """Trigger a batch of API calls concurrently (still limited by `MAX_CONCURRENCY`), results are in the same order.
+        :param calls: iterable of `(api_url, data)` tuples, or dicts of keyword arguments for `call()`
+        :param return_exceptions: same as `asyncio.gather`, return exceptions as results instead of raising the first one
+        """
+        tasks = [self.call(**c) if isinstance(c, dict) else self.call(*c) for c in calls]
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
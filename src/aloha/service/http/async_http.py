@@ -0,0 +1,47 @@
+__all__ = ('get_async_client', 'close_async_clients')
+
+import asyncio
+import weakref
+
+import httpx
+
+from ...logger import LOG
+from ...settings import SETTINGS
+from ...util import shutdown
+
+LOG.debug('Using httpx == %s' % httpx.__version__)
+
+_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient, as a client can only be used in one loop
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Get the shared async HTTP client (with connection pool) of the current event loop, settings in config:
+
+    service = {
+      http_client = {
+        pool_size = 100          # max connections in the pool
+        keepalive_expiry = 30    # seconds to keep an idle connection alive
+        timeout = 30             # default timeout in seconds
+      }
+    }
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        cfg = SETTINGS.config.get('service', {}).get('http_client', None) or {}
+        pool_size = int(cfg.get('pool_size', 100))
+        limits = httpx.Limits(
+            max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=float(cfg.get('keepalive_expiry', 30))
+        )
+        client = httpx.AsyncClient(limits=limits, timeout=float(cfg.get('timeout', 30)), follow_redirects=True)
+        if not _clients:
+            shutdown.register(close_async_clients)
+        _clients[loop] = client
+    return client
+
+
+async def close_async_clients() -> None:
+    """Close the shared async HTTP client of the current event loop."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -3,32 +3,40 @@ from abc import ABC, abstractmethod
 from urllib.parse import urljoin
 
 import requests
-from requests.adapters import HTTPAdapter, Retry
 
+from .codec import get_codec
+from .session import get_pooled_session, new_request_session
 from ...logger import LOG
-from ...settings import SETTINGS
+from ...settings import ConfigProperty
 
 
 class AbstractApiClient(ABC):
     LOG = LOG
     RETRY_METHOD_WHITELIST: frozenset = frozenset(['GET', 'POST'])
     RETRY_STATUS_FORCELIST: frozenset = frozenset({413, 429, 503, 502, 504})
-    config = SETTINGS.config
+    config = ConfigProperty()  # the current config, reloaded if the config files are changed
 
     def __init__(self, url_endpoint: str = None, *args, **kwargs):
         self.url_endpoint = url_endpoint or ''
         LOG.debug('API Caller URL endpoint set to: %s' % self.url_endpoint)
 
     @classmethod
-    def get_request_session(cls, total_retries: int = 3, *args, **kwargs) -> requests.Session:
-        session = requests.Session()
-        # https://urllib3.readthedocs.io/en/latest/reference/urllib3.util.html#urllib3.util.Retry.DEFAULT_ALLOWED_METHODS
-        retries = Retry(
-            total=total_retries, backoff_factor=0.1, method_whitelist=cls.RETRY_METHOD_WHITELIST, status_forcelist=cls.RETRY_STATUS_FORCELIST
+    def get_request_session(cls, total_retries: int = None, *args, **kwargs) -> requests.Session:
+        """Create a new session, use `self.session` instead to reuse connections across calls.
+        Settings not given in arguments (e.g. `total_retries`) are read from `service.http_client` in config.
+        """
+        return new_request_session(
+            total_retries=total_retries, allowed_methods=cls.RETRY_METHOD_WHITELIST, status_forcelist=cls.RETRY_STATUS_FORCELIST, **kwargs
+        )
+
+    @property
+    def session(self) -> requests.Session:
+        """Long-lived session with connection pool, shared by clients of the same class and endpoint in the process."""
+        cls = type(self)
+        return get_pooled_session(
+            ('%s.%s' % (cls.__module__, cls.__qualname__), self.url_endpoint),
+            allowed_methods=cls.RETRY_METHOD_WHITELIST, status_forcelist=cls.RETRY_STATUS_FORCELIST
         )
-        for prefix in ('http://', 'https://'):
-            session.mount(prefix, HTTPAdapter(max_retries=retries))
-        return session
 
     def get_headers(self, *args, **kwargs) -> dict:
         headers = {
@@ -54,14 +62,14 @@ class AbstractApiClient(ABC):
         body = data or dict()
         body.update(kwargs)
         payload = self.wrap_request_data(data=body)
-        LOG.debug('Calling api: %s' % api_url)
-        session = self.get_request_session()
-        resp = session.post(
-            urljoin(self.url_endpoint, api_url), json=payload, timeout=timeout, headers=self.get_headers()
+        LOG.debug('Calling api: %s', api_url)
+        codec = get_codec()
+        resp = self.session.post(
+            urljoin(self.url_endpoint, api_url), data=codec.dumps(payload), timeout=timeout, headers=self.get_headers()
         )
 
         try:
-            ret = resp.json()
+            ret = codec.loads(resp.content)
         except Exception as e:
             LOG.error(str(e))
             raise RuntimeError(resp.text)
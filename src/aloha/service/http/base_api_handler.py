@@ -1,25 +1,165 @@
-import json
+import functools
+import inspect
 from abc import ABC
+from collections.abc import Iterator
 from datetime import datetime
 from typing import Optional, Awaitable
 
 from tornado import web
 
+from .codec import get_codec
+from .executor import get_executor_config, run_in_executor
+from .metrics import METRICS, get_metrics_config
+from .profiler import acquire_request_profile, check_profiler_token, save_request_profile
+from .timing import NULL_TIMER, PhaseTimer, format_server_timing, get_slow_logger, get_timing_config
 from ...logger import LOG
+from ...logger.structured import set_log_context
+
+
+_UNSET = object()
+
+
+class RequestPayload:
+    """Lazily parsed payload of a request, the body and query arguments are parsed at most once per request."""
+    __slots__ = ('request', '_body', '_body_error', '_param')
+
+    def __init__(self, request):
+        self.request = request
+        self._body = _UNSET
+        self._body_error: Optional[ValueError] = None
+        self._param: Optional[dict] = None
+
+    @property
+    def raw(self) -> bytes:
+        """The raw request body, without copying."""
+        return self.request.body
+
+    @property
+    def view(self) -> memoryview:
+        return memoryview(self.request.body)
+
+    @property
+    def body(self):
+        """Request body parsed as JSON, raise `ValueError` if the body cannot be parsed."""
+        if self._body_error is not None:
+            raise self._body_error
+        if self._body is _UNSET:
+            try:
+                self._body = get_codec().loads(self.raw)  # parse bytes directly, without decoding to str
+            except ValueError as e:  # UnicodeDecodeError or JSONDecodeError
+                self._body_error = e
+                raise e
+        return self._body
+
+    @property
+    def param(self) -> dict:
+        """Query (and form) arguments, each value is parsed as JSON if possible, otherwise kept as a string."""
+        if self._param is None:
+            ret: dict = {}
+            codec = get_codec()
+            for k, v in self.request.arguments.items():
+                try:
+                    value = codec.loads(v[0])
+                except ValueError:
+                    value = v[0].decode('utf-8')
+                ret[k] = value
+            self._param = ret
+        return self._param
 
 
 class AbstractApiHandler(web.RequestHandler, ABC):
     LOG = LOG
     MAP_ERROR_INFO: dict = {
-        'BAD_REQUEST': {'code': '5101', 'message': ['Bad request: fail to parse body as JSON object!']}
+        'BAD_REQUEST': {'code': '5101', 'message': ['Bad request: fail to parse body as JSON object!']},
+        'SERVER_BUSY': {'code': '5103', 'message': ['Server busy: too many pending requests, please retry later!']},
     }
+    # how `response()` is executed: inline | thread | process | coroutine; None to use `service.executor.mode` in config
+    EXECUTOR: Optional[str] = None
+    _response_is_coroutine: bool = False  # set for each subclass on class creation
+    # format to stream iterable results: json (chunked JSON array) | ndjson; NDJSON is also used if the request accepts it
+    STREAM_FORMAT: str = 'json'
+    STREAM_BATCH_SIZE: int = 1000  # rows written (and flushed) each time when streaming results
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        func = inspect.getattr_static(cls, 'response', None)
+        if isinstance(func, (staticmethod, classmethod)):
+            func = func.__func__
+        cls._response_is_coroutine = inspect.iscoroutinefunction(func)
 
     def __init__(self, *args, **kwargs):
         self.api_args: Optional[tuple] = None
         self.api_kwargs: Optional[dict] = None
+        self._payload: Optional[RequestPayload] = None
+        self.api_code = None  # the `code` in response, recorded in metrics
+        self._response_size = 0
+        self._in_flight = False
         super().__init__(*args, **kwargs)
 
+        # notice: set before tornado runs the handler in a new task, which copies the context
+        set_log_context(request_id=self.request_id, route=self.request.path)
+        self._in_flight = True
+        if hasattr(self.application, 'num_active'):  # count in-flight requests, drained by `WebApplication.stop`
+            self.application.num_active += 1
+        self._metrics_enabled = get_metrics_config()['enabled']
+        if self._metrics_enabled:
+            METRICS.set_gauge('aloha_requests_in_flight', (('handler', type(self).__name__),), 1, delta=True)
+        self._timings: Optional[dict] = {} if get_timing_config()['enabled'] else None  # phase -> seconds
+
+    def timed(self, phase: str):
+        """Context manager recording the time spent in a phase of the request (parse, auth, handler, serialize, write),
+        the phases are sent in `Server-Timing` header and written to the slow log, see `service.timing` in config.
+        """
+        return NULL_TIMER if self._timings is None else PhaseTimer(self._timings, phase)
+
+    def _end_in_flight(self) -> None:
+        if not self._in_flight:
+            return
+        self._in_flight = False
+        if hasattr(self.application, 'num_active'):
+            self.application.num_active -= 1
+        if self._metrics_enabled:
+            handler = type(self).__name__
+            METRICS.set_gauge('aloha_requests_in_flight', (('handler', handler),), -1, delta=True)
+            METRICS.record_request(
+                handler=handler, method=self.request.method,
+                status=self.get_status() if self._finished else 499,  # 499: client closed the connection before response
+                code=self.api_code, latency=self.request.request_time(),
+                request_size=len(self.request.body) or int(self.request.headers.get('Content-Length', 0)),  # streamed body
+                response_size=self._response_size,
+            )
+        if self._timings is not None:
+            self._log_slow_request()
+
+    def _log_slow_request(self) -> None:
+        threshold = get_timing_config()['slow_threshold']
+        latency = self.request.request_time()
+        if 0 < threshold < latency:
+            get_slow_logger().warning('Slow request [%s] %s %s -> %s in %.3fs: %s' % (
+                self.request_id, self.request.method, self.request.path,
+                self.get_status() if self._finished else 499, latency,
+                ', '.join('%s=%.3fs' % (phase, t) for phase, t in self._timings.items()),
+            ))
+
+    def flush(self, include_footers: bool = False):
+        if self._timings and not self._headers_written and get_timing_config()['header']:
+            self.set_header('Server-Timing', format_server_timing(self._timings))
+        self._response_size += sum(len(chunk) for chunk in self._write_buffer)
+        with self.timed('write'):  # notice: the time to pass the data to the socket, not waiting for it to be sent
+            return super().flush(include_footers=include_footers)
+
+    def finish(self, chunk=None):
+        if isinstance(chunk, dict):
+            self.api_code = chunk.get('code', self.api_code)
+        return super().finish(chunk)
+
+    def on_connection_close(self) -> None:
+        # notice: requests aborted (client disconnected, streaming failed, etc.) never reach `on_finish`
+        self._end_in_flight()
+        super().on_connection_close()
+
     def on_finish(self) -> None:
+        self._end_in_flight()
         func_callback = getattr(self, 'callback', None)
         if callable(func_callback) \
                 and isinstance(self.api_args, tuple) \
@@ -29,6 +169,136 @@ class AbstractApiHandler(web.RequestHandler, ABC):
     def response(self, *args, **kwargs) -> dict:
         raise NotImplementedError()
 
+    async def call_response(self, *args, **kwargs):
+        """Call `self.response()` according to the executor mode of the handler.
+        - inline: call it in the event loop thread, blocking the loop until it returns;
+        - thread: call it in a thread pool, suitable for blocking IO such as DB queries;
+        - process: call it in a process pool for CPU bound tasks, `response` MUST be a staticmethod/classmethod;
+        - coroutine: call it in the event loop and await the result if it is awaitable.
+        An `async def response()` is always awaited in the event loop, regardless of the executor mode.
+
+        With header `Profile-Token` matching `service.profiler.token` in config, the call is profiled with cProfile,
+        saved as `{request_id}.prof` (see `aloha.service.profiler`).
+        """
+        profile = None
+        if 'Profile-Token' in self.request.headers and check_profiler_token(self.request.headers['Profile-Token']):
+            profile = acquire_request_profile()
+        with self.timed('handler'):
+            if profile is None:
+                return await self._call_response(None, *args, **kwargs)
+            try:
+                return await self._call_response(profile, *args, **kwargs)
+            finally:
+                save_request_profile(profile, self.request_id)
+                self.set_header('Request-ID', self.request_id)
+
+    async def _call_response(self, profile, *args, **kwargs):
+        if self._response_is_coroutine:
+            if profile is None:
+                return await self.response(*args, **kwargs)
+            with profile:  # notice: other coroutines running in the event loop meanwhile are profiled as well
+                return await self.response(*args, **kwargs)
+
+        mode = self.EXECUTOR or get_executor_config()['mode']
+        func = self.response if profile is None else functools.partial(profile.runcall, self.response)
+        if mode == 'thread':
+            return await run_in_executor(mode, func, *args, **kwargs)
+        elif mode == 'process':
+            func = inspect.getattr_static(type(self), 'response')
+            if not isinstance(func, (staticmethod, classmethod)):
+                raise TypeError('`response` of %s MUST be a staticmethod or classmethod to run in process pool!' % type(self).__name__)
+            # notice: not profiled, as it runs in another process
+            return await run_in_executor(mode, type(self).response, *args, **kwargs)
+
+        result = func(*args, **kwargs)
+        if mode == 'coroutine' and inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def dumps_response(self, resp) -> bytes:
+        """Serialize the response object with the configured codec."""
+        with self.timed('serialize'):
+            return get_codec().dumps(resp)
+
+    @staticmethod
+    def is_stream_result(result) -> bool:
+        """If the result of `response()` should be streamed: generators, (async) iterators, pandas DataFrame, pyarrow Table."""
+        if result is None or isinstance(result, (str, bytes, dict, list, tuple)):
+            return False
+        return isinstance(result, Iterator) or hasattr(result, '__aiter__') \
+            or hasattr(result, 'to_batches') \
+            or (hasattr(result, 'iloc') and hasattr(result, 'columns'))
+
+    async def _iter_stream_batches(self, result):
+        """Iterate over the result as batches (list) of rows, blocking iterators are consumed in the thread pool if enabled."""
+        n = self.STREAM_BATCH_SIZE
+        if hasattr(result, 'to_batches'):  # pyarrow Table
+            for batch in result.to_batches(max_chunksize=n):
+                yield batch.to_pylist()
+        elif hasattr(result, 'iloc'):  # pandas DataFrame
+            for i in range(0, len(result), n):
+                chunk = result.iloc[i:i + n]
+                # NaN / NaT / None cells are written as null, as `DataFrame.to_json` does, instead of the invalid JSON token NaN
+                yield chunk.astype(object).where(chunk.notna(), None).to_dict(orient='records')
+        elif hasattr(result, '__aiter__'):
+            batch = []
+            async for row in result:
+                batch.append(row)
+                if len(batch) >= n:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        else:
+            in_thread = (self.EXECUTOR or get_executor_config()['mode']) == 'thread'
+            while True:
+                if in_thread:
+                    batch = await run_in_executor('thread', _next_batch, result, n)
+                else:
+                    batch = _next_batch(result, n)
+                if batch:
+                    yield batch
+                if len(batch) < n:
+                    break
+
+    async def finish_stream(self, result, envelope: dict = None):
+        """Stream rows of the result to client in chunks, flushed after each batch, so that the memory is bounded.
+        - json: a JSON array, which is set as the `data` field of `envelope` if it is given;
+        - ndjson: one JSON object per line (without envelope), if `STREAM_FORMAT` is ndjson or the request accepts it.
+        """
+        codec = get_codec()
+        ndjson = self.STREAM_FORMAT == 'ndjson' or 'application/x-ndjson' in self.request.headers.get('Accept', '')
+        if ndjson:
+            self.set_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+            sep, prefix, suffix = b'\n', b'', b'\n'
+        else:
+            sep, prefix, suffix = b',', b'[', b']'
+            if envelope is not None:
+                s = codec.dumps(envelope)
+                prefix, suffix = s[:-1] + (b',' if len(envelope) > 0 else b'') + b'"data":[', b']}'
+
+        if envelope is not None:
+            self.api_code = envelope.get('code')
+        n_rows = 0
+        try:
+            self.write(prefix)
+            async for batch in self._iter_stream_batches(result):
+                with self.timed('serialize'):
+                    chunk = sep.join(codec.dumps(row) for row in batch)
+                if ndjson:
+                    self.write(chunk + sep)
+                else:
+                    self.write(chunk if n_rows == 0 else sep + chunk)
+                n_rows += len(batch)
+                await self.flush()
+            if not ndjson:
+                self.write(suffix)
+        except Exception as e:  # the response is partially sent, abort the connection so that client knows it is incomplete
+            self.LOG.error('Error streaming response [%s] after %s rows: %s' % (self.request_id, n_rows, e), exc_info=True)
+            self.request.connection.close()
+            return
+        return self.finish()
+
     def set_default_headers(self) -> None:
         self.set_header('Content-Type', 'application/json; charset=utf-8')
 
@@ -46,32 +316,45 @@ class AbstractApiHandler(web.RequestHandler, ABC):
         return self.request.headers.get('Request-ID')
 
     @property
-    def request_body(self) -> dict:
+    def payload(self) -> RequestPayload:
+        if self._payload is None:
+            self._payload = RequestPayload(self.request)
+        return self._payload
+
+    @property
+    def request_body(self) -> Optional[dict]:
+        """Request body parsed as JSON (cached), `None` and request finished with BAD_REQUEST if it is invalid.
+        Notice: the returned object is shared by all accesses in the same request, do NOT modify it in place.
+        """
         content_type: str = self.request_header_content_type
-        body_arguments: dict = Optional[None]
+        body_arguments: Optional[dict] = None
 
         if content_type.startswith('multipart/form-data'):  # only parse files when 'Content-Type' starts with 'multipart/form-data'
-            body_arguments = self.request_param  # self.request.body_arguments
+            with self.timed('parse'):
+                body_arguments = self.request_param  # self.request.body_arguments
         else:
             try:
-                body = self.request.body.decode('utf-8')
-                body_arguments = json.loads(body)
-            except (UnicodeDecodeError, json.decoder.JSONDecodeError):  # invalid request body, cannot be parsed as JSON
-                self.finish(self.MAP_ERROR_INFO['BAD_REQUEST'])
+                with self.timed('parse'):
+                    body_arguments = self.payload.body
+            except ValueError:  # invalid request body, cannot be parsed as JSON
+                if not self._finished:
+                    self.finish(self.MAP_ERROR_INFO['BAD_REQUEST'])
+        if self._finished:  # e.g. the (streamed) body is invalid and finished as BAD_REQUEST
+            return None
         return body_arguments
 
     @property
     def request_param(self) -> dict:
-        ret: dict = {}
-        for k, v in self.request.arguments.items():
-            val = v[0].decode('utf-8')
-            try:
-                value = json.loads(val)
-            except json.JSONDecodeError:
-                value = val
-            ret[k] = value
+        return self.payload.param
+
 
-        return ret
+def _next_batch(iterator, n: int) -> list:
+    batch = []
+    for row in iterator:
+        batch.append(row)
+        if len(batch) >= n:
+            break
+    return batch
 
 
 class DefaultHandler404(AbstractApiHandler):
@@ -86,6 +369,6 @@ class DefaultHandler404(AbstractApiHandler):
                 'Requested URL cannot be found: %s' % self.request.uri
             ]
         }
-        msg = json.dumps(msg, ensure_ascii=False, default=str, separators=(',', ':'))
+        msg = get_codec().dumps(msg)
         self.set_status(404, reason='Not Found')
         self.finish(msg)
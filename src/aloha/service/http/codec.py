@@ -0,0 +1,125 @@
+__all__ = ('JsonCodec', 'OrjsonCodec', 'UjsonCodec', 'MsgspecCodec', 'json_default', 'get_codec')
+
+import json
+from datetime import date, datetime, time
+
+from ...logger import LOG
+from ...settings import SETTINGS
+
+
+def json_default(obj):
+    """Encode objects which are not natively supported by JSON, being aware of pandas/numpy/datetime types.
+    Types not listed below are encoded by `str()`, which is the same as `json.dumps(..., default=str)`.
+    """
+    if type(obj).__name__ == 'NaTType':  # notice: pandas NaTType is a subclass of datetime
+        return None
+    if isinstance(obj, (datetime, date, time)):  # including pandas Timestamp
+        return str(obj)
+    if hasattr(obj, 'tolist'):  # numpy arrays and numpy scalars
+        return obj.tolist()
+    if hasattr(obj, 'to_dict') and hasattr(obj, 'columns'):  # pandas DataFrame
+        return obj.to_dict(orient='records')
+    if hasattr(obj, 'to_dict'):  # pandas Series
+        return obj.to_dict()
+    return str(obj)
+
+
+class JsonCodec:
+    """JSON codec based on the `json` module of python standard library.
+    `loads` accepts both `bytes` and `str`, `dumps` always returns UTF-8 encoded `bytes`.
+    Errors of parsing are raised as `ValueError` for all codecs.
+    """
+    name = 'json'
+
+    def __init__(self, default=json_default):
+        self.default = default
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, default=self.default, separators=(',', ':')).encode('utf-8')
+
+
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+    def __init__(self, default=json_default):
+        super().__init__(default=default)
+        import orjson
+        self._orjson = orjson
+        # let `default` handle datetime, so that the output is the same as the stdlib codec
+        self._option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def loads(self, data):
+        return self._orjson.loads(data)  # orjson.JSONDecodeError is a subclass of ValueError
+
+    def dumps(self, obj) -> bytes:
+        return self._orjson.dumps(obj, default=self.default, option=self._option)
+
+
+class UjsonCodec(JsonCodec):
+    name = 'ujson'
+
+    def __init__(self, default=json_default):
+        super().__init__(default=default)
+        import ujson
+        self._ujson = ujson
+
+    def loads(self, data):
+        return self._ujson.loads(data)
+
+    def dumps(self, obj) -> bytes:
+        return self._ujson.dumps(obj, ensure_ascii=False, default=self.default).encode('utf-8')
+
+
+class MsgspecCodec(JsonCodec):
+    """Notice: msgspec encodes datetime/date/time natively (so `default` is never called for them) in ISO 8601 format,
+    e.g. "2024-01-01T08:00:00", while the other codecs output `str(dt)`, e.g. "2024-01-01 08:00:00".
+    msgspec has no option to pass them through, use another codec if clients depend on the format.
+    """
+    name = 'msgspec'
+
+    def __init__(self, default=json_default):
+        super().__init__(default=default)
+        import msgspec
+        self._error = msgspec.DecodeError
+        self._encoder = msgspec.json.Encoder(enc_hook=default)
+        self._decoder = msgspec.json.Decoder()
+
+    def loads(self, data):
+        try:
+            return self._decoder.decode(data)
+        except self._error as e:
+            raise ValueError(str(e)) from e
+
+    def dumps(self, obj) -> bytes:
+        return self._encoder.encode(obj)
+
+
+_CODECS = {c.name: c for c in (JsonCodec, OrjsonCodec, UjsonCodec, MsgspecCodec)}
+_codec_cache: dict = {}
+
+
+def get_codec(name: str = None) -> JsonCodec:
+    """Get the JSON codec by name, or the one specified by `service.json_codec` in config (default: `json`).
+    Fallback to the stdlib codec if the specified package is not installed. The outputs are the same except datetime with msgspec.
+    """
+    codec = _codec_cache.get(name)  # the codec from config is cached with key `None`
+    if codec is None:
+        name_codec = name or SETTINGS.config.get('service', {}).get('json_codec', None) or 'json'
+        cls = _CODECS.get(name_codec)
+        if cls is None:
+            raise ValueError('Invalid JSON codec: %s, expecting one of %s' % (name_codec, sorted(_CODECS.keys())))
+        try:
+            codec = cls()
+        except ImportError:
+            LOG.warning('[%s] NOT installed, fallback to stdlib json codec! Consider `pip install %s`!' % (name_codec, name_codec))
+            codec = JsonCodec()
+        _codec_cache[name] = codec
+    return codec
+
+
+@SETTINGS.subscribe('service.json_codec')
+def _on_config_changed(value):
+    _codec_cache.pop(None, None)  # created again on next call
@@ -0,0 +1,115 @@
+__all__ = ('EXECUTOR_MODES', 'ExecutorBusyError', 'get_executor_config', 'get_executor', 'run_in_executor', 'shutdown_executors')
+
+import asyncio
+import contextvars
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from ...logger import LOG
+from ...settings import SETTINGS
+from ...util import shutdown
+
+EXECUTOR_MODES = ('inline', 'thread', 'process', 'coroutine')
+
+_config: dict = None  # parsed executor settings, see `get_executor_config`
+_executors: dict = {}  # mode -> Executor, created lazily (after the web app forks its worker processes)
+_pending: dict = {}  # mode -> number of calls submitted but not finished yet
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when the pending calls of an executor exceeds its configured queue depth."""
+
+
+def get_executor_config() -> dict:
+    """Read executor settings from config, e.g.:
+
+    service = {
+      executor = {
+        mode = thread       # default mode for handlers: inline | thread | process | coroutine
+        max_workers = 8     # threads in the thread pool
+        max_processes = 4   # processes in the process pool
+        max_queue = 64      # max calls waiting for a free worker, beyond which requests are rejected
+      }
+    }
+    """
+    global _config
+    if _config is None:
+        cfg = SETTINGS.config.get('service', {}).get('executor', None) or {}
+        n_cpu = os.cpu_count() or 1
+        mode = cfg.get('mode', 'inline')
+        if mode not in EXECUTOR_MODES:
+            raise ValueError('Invalid `service.executor.mode`: %s, expecting one of %s' % (mode, EXECUTOR_MODES))
+        _config = {
+            'mode': mode,
+            'max_workers': int(cfg.get('max_workers', min(32, n_cpu + 4))),
+            'max_processes': int(cfg.get('max_processes', n_cpu)),
+            'max_queue': int(cfg.get('max_queue', 64)),
+        }
+    return _config
+
+
+def get_executor(mode: str) -> Executor:
+    executor = _executors.get(mode)
+    if executor is None:
+        cfg = get_executor_config()
+        if mode == 'thread':
+            executor = ThreadPoolExecutor(max_workers=cfg['max_workers'], thread_name_prefix='aloha-api')
+            LOG.info('Created thread pool with max_workers=%s for API handlers', cfg['max_workers'])
+        elif mode == 'process':
+            executor = ProcessPoolExecutor(max_workers=cfg['max_processes'])
+            LOG.info('Created process pool with max_workers=%s for API handlers', cfg['max_processes'])
+        else:
+            raise ValueError('No executor pool for mode: %s' % mode)
+        if not _executors:
+            shutdown.unregister(shutdown_executors)  # registered again if the pools are recreated
+            shutdown.register(shutdown_executors)
+        _executors[mode] = executor
+    return executor
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    """Shutdown the executor pools, waiting for the submitted calls to finish by default."""
+    while _executors:
+        mode, executor = _executors.popitem()
+        executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+@SETTINGS.subscribe('service.executor')
+def _on_config_changed(value):
+    """Apply the new settings: new pools are created for new calls, the calls submitted to the old ones still finish.
+    Notice: called in the event loop submitting the calls (see `Settings.notify_in`), so no call is submitted to a pool shut down.
+    """
+    global _config
+    _config = None
+    while _executors:
+        mode, executor = _executors.popitem()
+        executor.shutdown(wait=False)
+        LOG.info('Executor pool of %s mode will be recreated as config changed.' % mode)
+
+
+def _get_pool_size(mode: str) -> int:
+    cfg = get_executor_config()
+    return cfg['max_processes'] if mode == 'process' else cfg['max_workers']
+
+
+async def run_in_executor(mode: str, func, *args, **kwargs):
+    """Run `func` in the pool of given mode, without blocking the event loop.
+
+    The number of pending calls per pool is bounded by `max_workers + max_queue`,
+    an `ExecutorBusyError` is raised immediately instead of queueing more calls.
+    """
+    executor = get_executor(mode)
+    limit = _get_pool_size(mode) + get_executor_config()['max_queue']
+    n_pending = _pending.get(mode, 0)
+    if n_pending >= limit:
+        raise ExecutorBusyError('Too many pending calls in %s executor: %s' % (mode, n_pending))
+
+    _pending[mode] = n_pending + 1  # only modified from the event loop thread, no lock needed
+    try:
+        loop = asyncio.get_running_loop()
+        if mode == 'thread':  # propagate the context (e.g. the request context of logs) to the thread, as `asyncio.to_thread`
+            return await loop.run_in_executor(executor, partial(contextvars.copy_context().run, func, *args, **kwargs))
+        return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+    finally:
+        _pending[mode] -= 1
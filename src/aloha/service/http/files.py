@@ -1,8 +1,13 @@
+import asyncio
+import io
+import tempfile
 import time
 
 import requests
 
+from .async_http import get_async_client
 from ...logger import LOG
+from ...times.timeout_asyncio import timeout
 
 
 def iter_over_request_files(request, url_files):
@@ -31,3 +36,82 @@ def iter_over_request_files(request, url_files):
             t_cost = time.time() - t_start
             LOG.info(f"File {url} has content type {content_type} and length bytes={len(body)}, downloaded in {t_cost} seconds")
             yield 'url_files', url, content_type, body
+
+
+async def _download_url_file(url: str, semaphore: asyncio.Semaphore, max_size: int = None, time_limit: float = None,
+                             spool_max_size: int = 1024 * 1024):
+    """Stream the content of given url into a spooled temp file, return a tuple of (url, content_type, file, size)."""
+    async with semaphore:
+        t_start = time.time()
+        file = tempfile.SpooledTemporaryFile(max_size=spool_max_size)
+        try:
+            async with timeout(time_limit):
+                async with get_async_client().stream('GET', url) as resp:
+                    if resp.status_code != 200:
+                        raise RuntimeError("Failed to download file after %s seconds with code=%s from URL %s" % (
+                            time.time() - t_start, resp.status_code, url
+                        ))
+                    content_length = int(resp.headers.get('Content-Length', 0))
+                    if max_size is not None and content_length > max_size:
+                        raise ValueError("File size %s exceeds limit of %s bytes from URL %s" % (content_length, max_size, url))
+
+                    size = 0
+                    async for chunk in resp.aiter_bytes():
+                        size += len(chunk)
+                        if max_size is not None and size > max_size:
+                            raise ValueError("File size exceeds limit of %s bytes from URL %s" % (max_size, url))
+                        file.write(chunk)
+                    content_type = resp.headers.get("Content-Type", "UNKNOWN")
+        except asyncio.TimeoutError:
+            file.close()
+            raise TimeoutError("Failed to download file in %s seconds from URL %s" % (time_limit, url))
+        except BaseException as e:
+            file.close()
+            raise e
+
+    file.seek(0)
+    t_cost = time.time() - t_start
+    LOG.info(f"File {url} has content type {content_type} and length bytes={size}, downloaded in {t_cost} seconds")
+    return url, content_type, file, size
+
+
+async def aiter_over_request_files(request, url_files, max_concurrency: int = 8, max_size: int = None, time_limit: float = 60,
+                                   as_file: bool = False):
+    """Async version of `iter_over_request_files`, the files specified by `url_files` are downloaded concurrently
+    (at most `max_concurrency` at the same time) using a shared pooled HTTP client, and yielded as they complete.
+
+    :param request: the tornado request object
+    :param url_files: list of URLs to download
+    :param max_concurrency: max number of concurrent downloads
+    :param max_size: max size in bytes of each downloaded file, None for no limit
+    :param time_limit: max time in seconds to download each file, None for no limit
+    :param as_file: yield file-like objects instead of bytes, the downloaded files are streamed to spooled temp files
+    :return: async generator of tuple: (file_key, file_name, content_type, body)
+    """
+    for file_key, file_name, content_type, body in iter_over_request_files(request, url_files=None):
+        yield file_key, file_name, content_type, io.BytesIO(body) if as_file else body
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = [
+        asyncio.ensure_future(_download_url_file(url, semaphore, max_size=max_size, time_limit=time_limit))
+        for url in sorted(set(url_files or []))
+    ]
+    consumed = set()  # url of the files yielded, which are owned by the caller
+    try:
+        for future in asyncio.as_completed(tasks):
+            url, content_type, file, size = await future
+            consumed.add(url)
+            if as_file:
+                yield 'url_files', url, content_type, file
+            else:
+                with file:
+                    yield 'url_files', url, content_type, file.read()
+    finally:  # cancel the pending downloads if any of them fails or the generator is closed
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                if task.exception() is None:  # notice: calling `exception()` also marks the error as retrieved
+                    url, content_type, file, size = task.result()
+                    if url not in consumed:  # downloaded but never yielded
+                        file.close()
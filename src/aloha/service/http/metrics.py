@@ -0,0 +1,278 @@
+__all__ = ('LATENCY_BUCKETS', 'SIZE_BUCKETS', 'METRICS', 'MetricsRegistry', 'get_metrics_config')
+
+import bisect
+import json
+import os
+import tempfile
+
+from tornado.ioloop import IOLoop
+
+from ...logger import LOG
+from ...settings import SETTINGS
+from ...util import shutdown
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # seconds
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))  # bytes, 256B ~ 64MB
+QUANTILES = (0.5, 0.95, 0.99)
+
+_GROUP_PID = os.getpid()  # notice: imported before the web app forks workers, so this is the pid of the main process
+_config: dict = None
+
+
+def get_metrics_config() -> dict:
+    """Read metrics settings from config, e.g.:
+
+    service = {
+      modules = ["aloha.service.metrics", ...]  # mount the metrics route
+      metrics = {
+        enabled = true       # record metrics of requests, default to true if `aloha.service.metrics` is in modules
+        path = "/metrics"    # route of the metrics in Prometheus text format
+        dir = "/tmp/aloha-metrics"   # where worker processes write snapshots to be aggregated, default in temp dir
+        flush_interval = 5   # seconds between snapshots written by each worker process
+      }
+    }
+    """
+    global _config
+    if _config is None:
+        cfg_service = SETTINGS.config.get('service', {})
+        cfg = cfg_service.get('metrics', None) or {}
+        _config = {
+            'enabled': bool(cfg.get('enabled', 'aloha.service.metrics' in (cfg_service.get('modules', None) or []))),
+            'path': cfg.get('path', '/metrics'),
+            'dir': cfg.get('dir', None) or os.path.join(tempfile.gettempdir(), 'aloha-metrics-%s' % _GROUP_PID),
+            'flush_interval': float(cfg.get('flush_interval', 5)),
+        }
+    return _config
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms of the current process, keyed by (metric name, labels as a tuple of pairs).
+    Notice: it is updated from the event loop thread only, so no lock is used.
+
+    Each worker process writes its snapshot to a file in `dir` periodically, and `aggregate` sums up the snapshots of
+    all worker processes, so the metrics are correct whichever worker serves the metrics route.
+    Snapshots of exited workers are merged into an archive file, so counters never go back.
+    """
+
+    def __init__(self):
+        self.counters: dict = {}
+        self.gauges: dict = {}
+        self.histograms: dict = {}  # key -> [bucket counts (with +Inf)..., sum, count]
+        self.buckets: dict = {}  # metric name -> bucket bounds
+        self._flush_scheduled = False
+        self._hook_registered = False
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():  # do not report the metrics of parent process again in forked process
+            self.__init__()
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1) -> None:
+        self._check_fork()
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, labels: tuple = (), value: float = 0, delta: bool = False) -> None:
+        self._check_fork()
+        key = (name, labels)
+        self.gauges[key] = (self.gauges.get(key, 0) + value) if delta else value
+
+    def observe(self, name: str, labels: tuple, value: float, buckets: tuple = LATENCY_BUCKETS) -> None:
+        self._check_fork()
+        key = (name, labels)
+        h = self.histograms.get(key)
+        if h is None:
+            self.buckets.setdefault(name, buckets)
+            h = self.histograms[key] = [0] * (len(buckets) + 3)
+        h[bisect.bisect_left(buckets, value)] += 1
+        h[-2] += value
+        h[-1] += 1
+
+    def record_request(self, handler: str, method: str, status: int, code, latency: float, request_size: int, response_size: int):
+        labels = (('handler', handler), ('method', method))
+        self.inc('aloha_requests_total', labels + (('status', str(status)),))
+        if code is not None:
+            self.inc('aloha_api_codes_total', (('handler', handler), ('code', str(code))))
+        self.observe('aloha_request_duration_seconds', labels, latency, LATENCY_BUCKETS)
+        self.observe('aloha_request_size_bytes', labels, request_size, SIZE_BUCKETS)
+        self.observe('aloha_response_size_bytes', labels, response_size, SIZE_BUCKETS)
+
+        if not self._flush_scheduled:  # write the snapshot at most once per interval
+            if not self._hook_registered:  # so that the requests handled by a stopped worker are still counted
+                shutdown.register(self.flush)
+                self._hook_registered = True
+            self._flush_scheduled = True
+            IOLoop.current().call_later(get_metrics_config()['flush_interval'], self.flush)
+
+    # ---------------------------------------- multi-process ----------------------------------------
+    def snapshot(self) -> dict:
+        self._check_fork()
+        return {
+            'pid': self._pid,
+            'buckets': {k: list(v) for k, v in self.buckets.items()},
+            'counters': [[name, labels, v] for (name, labels), v in self.counters.items()],
+            'gauges': [[name, labels, v] for (name, labels), v in self.gauges.items()],
+            'histograms': [[name, labels, h] for (name, labels), h in self.histograms.items()],
+        }
+
+    @staticmethod
+    def _write(path: str, data: dict) -> None:
+        path_tmp = '%s.%s.tmp' % (path, os.getpid())
+        with open(path_tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(path_tmp, path)  # atomic, readers never see a partial file
+
+    def flush(self) -> None:
+        """Write the snapshot of current process to the metrics dir."""
+        self._check_fork()
+        self._flush_scheduled = False
+        folder = get_metrics_config()['dir']
+        try:
+            os.makedirs(folder, exist_ok=True)
+            self._write(os.path.join(folder, 'p%s.json' % os.getpid()), self.snapshot())
+        except OSError as e:
+            LOG.error('Failed to write metrics to %s: %s' % (folder, e))
+
+    @staticmethod
+    def _merge(into: dict, snapshot: dict, with_gauges: bool = True) -> None:
+        into['buckets'].update(snapshot.get('buckets', {}))
+        for name, labels, v in snapshot.get('counters', []):
+            key = (name, tuple(map(tuple, labels)))
+            into['counters'][key] = into['counters'].get(key, 0) + v
+        if with_gauges:
+            for name, labels, v in snapshot.get('gauges', []):
+                key = (name, tuple(map(tuple, labels)))
+                into['gauges'][key] = into['gauges'].get(key, 0) + v
+        for name, labels, h in snapshot.get('histograms', []):
+            key = (name, tuple(map(tuple, labels)))
+            merged = into['histograms'].get(key)
+            into['histograms'][key] = list(h) if merged is None else [a + b for a, b in zip(merged, h)]
+
+    @staticmethod
+    def _to_snapshot(merged: dict) -> dict:
+        return {
+            'buckets': merged['buckets'],
+            'counters': [[name, labels, v] for (name, labels), v in merged['counters'].items()],
+            'histograms': [[name, labels, h] for (name, labels), h in merged['histograms'].items()],
+        }
+
+    def aggregate(self) -> dict:
+        """Sum up the snapshots of all worker processes (gauges of live processes only)."""
+        self.flush()
+        folder = get_metrics_config()['dir']
+        merged = {'buckets': {}, 'counters': {}, 'gauges': {}, 'histograms': {}}
+        path_archive = os.path.join(folder, 'archive.json')
+        dead = []
+        for file_name in sorted(os.listdir(folder)):
+            if not (file_name.startswith('p') and file_name.endswith('.json')):
+                continue
+            path = os.path.join(folder, file_name)
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):  # removed by another process in the meantime
+                continue
+            if _pid_alive(int(snapshot['pid'])):
+                self._merge(merged, snapshot)
+            else:  # counted in the archive below
+                dead.append((path, snapshot))
+
+        if dead:
+            self._archive(path_archive, dead)
+        try:
+            with open(path_archive) as f:
+                self._merge(merged, json.load(f), with_gauges=False)
+        except (OSError, ValueError):
+            pass
+        return merged
+
+    def _archive(self, path_archive: str, dead: list) -> None:
+        """Merge the snapshots of exited processes into the archive, locked as workers may do it at the same time."""
+        import fcntl
+        with open(path_archive + '.lock', 'w') as f_lock:
+            fcntl.flock(f_lock, fcntl.LOCK_EX)
+            archive = {'buckets': {}, 'counters': {}, 'gauges': {}, 'histograms': {}}
+            try:
+                with open(path_archive) as f:
+                    self._merge(archive, json.load(f), with_gauges=False)
+            except (OSError, ValueError):
+                pass
+            for path, snapshot in dead:
+                if os.path.exists(path):  # not archived by another process yet
+                    self._merge(archive, snapshot, with_gauges=False)
+                    os.remove(path)
+            self._write(path_archive, self._to_snapshot(archive))
+
+    # ---------------------------------------- exposition ----------------------------------------
+    @staticmethod
+    def _format_labels(labels, extra: tuple = ()) -> str:
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+
+    @staticmethod
+    def _quantile(bounds: list, counts: list, total: int, q: float) -> float:
+        """Estimate the quantile from histogram buckets, by linear interpolation in the bucket like Prometheus does."""
+        rank, cumulative = q * total, 0
+        for i, n in enumerate(counts):
+            if cumulative + n >= rank and n > 0:
+                if i >= len(bounds):  # in the +Inf bucket
+                    return bounds[-1]
+                lower = bounds[i - 1] if i > 0 else 0
+                return lower + (bounds[i] - lower) * (rank - cumulative) / n
+            cumulative += n
+        return 0.0
+
+    def render(self, merged: dict) -> str:
+        """Render the aggregated metrics in Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind):
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        for kind, values in (('counter', merged['counters']), ('gauge', merged['gauges'])):
+            last = None
+            for (name, labels), v in sorted(values.items()):
+                if name != last:
+                    header(name, kind)
+                    last = name
+                lines.append('%s%s %s' % (name, self._format_labels(labels), v))
+
+        last = None
+        quantiles = []
+        for (name, labels), h in sorted(merged['histograms'].items()):
+            bounds = merged['buckets'].get(name, LATENCY_BUCKETS)
+            if name != last:
+                header(name, 'histogram')
+                last = name
+            counts, total_sum, total = h[:-2], h[-2], h[-1]
+            cumulative = 0
+            for bound, n in zip(list(bounds) + ['+Inf'], counts):
+                cumulative += n
+                lines.append('%s_bucket%s %s' % (name, self._format_labels(labels, (('le', bound),)), cumulative))
+            lines.append('%s_sum%s %s' % (name, self._format_labels(labels), total_sum))
+            lines.append('%s_count%s %s' % (name, self._format_labels(labels), total))
+            if name == 'aloha_request_duration_seconds' and total > 0:
+                for q in QUANTILES:
+                    quantiles.append((labels, q, self._quantile(bounds, counts, total, q)))
+
+        if quantiles:  # p50 / p95 / p99 estimated from the aggregated histogram
+            header('aloha_request_duration_seconds_quantile', 'gauge')
+            for labels, q, v in quantiles:
+                lines.append('aloha_request_duration_seconds_quantile%s %s' % (self._format_labels(labels, (('quantile', q),)), v))
+
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
@@ -0,0 +1,150 @@
+__all__ = (
+    'ProfilerBusyError', 'SamplingProfiler', 'get_profiler_config', 'check_profiler_token',
+    'acquire_request_profile', 'save_request_profile', 'format_request_profile',
+)
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from ...logger import LOG
+from ...settings import SETTINGS
+
+_config: dict = None
+_request_profile_lock = threading.Lock()  # only one deterministic profiler can be active in a process
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a sampling profile is already running in the process."""
+
+
+def get_profiler_config() -> dict:
+    """Read profiler settings from config, e.g.:
+
+    service = {
+      modules = ["aloha.service.profiler", ...]  # mount the admin routes
+      profiler = {
+        token = "change-me"      # required in `Profile-Token` header (or `token` query argument), routes are disabled if empty
+        path = "/admin/profile"  # sampling profile of the process: GET /admin/profile?seconds=10
+        max_seconds = 60         # upper bound of the sampling duration
+        interval = 0.005         # seconds between samples
+        dir = "logs/profile"     # where per-request profiles are saved, as {request_id}.prof
+      }
+    }
+
+    A request with header `Profile-Token: <token>` is profiled with cProfile deterministically,
+    and the stats can be read at `GET {path}/request/{request_id}`.
+    """
+    global _config
+    if _config is None:
+        cfg = SETTINGS.config.get('service', {}).get('profiler', None) or {}
+        _config = {
+            'token': str(cfg.get('token', None) or ''),
+            'path': cfg.get('path', '/admin/profile').rstrip('/'),
+            'max_seconds': float(cfg.get('max_seconds', 60)),
+            'interval': float(cfg.get('interval', 0.005)),
+            'dir': cfg.get('dir', None) or os.path.join(os.environ.get('DIR_LOG', 'logs'), 'profile'),
+        }
+    return _config
+
+
+@SETTINGS.subscribe('service.profiler')
+def _on_config_changed(value):
+    global _config
+    _config = None  # read again on next access
+
+
+def check_profiler_token(token: Optional[str]) -> bool:
+    expected = get_profiler_config()['token']
+    return bool(expected) and token is not None and hmac.compare_digest(token.encode(), expected.encode())
+
+
+class SamplingProfiler:
+    """Statistical profiler of all threads of the current process, by sampling `sys._current_frames()` periodically
+    in a background thread, so the process keeps serving without being restarted or instrumented.
+    The result is in the collapsed stacks format (`frame;frame;frame count` per line) consumed by flame graph tools.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.n_samples = 0
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return '%s (%s:%d)' % (code.co_name, code.co_filename, code.co_firstlineno)
+
+    def sample_once(self, exclude_thread: int = None) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == exclude_thread:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, 'thread-%s' % thread_id))
+            self.stacks[';'.join(reversed(stack))] += 1
+        self.n_samples += 1
+
+    def run(self, seconds: float) -> str:
+        """Sample for the given seconds (blocking, call it in a thread), return the collapsed stacks."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError('Another sampling profile is running in process [%s]!' % os.getpid())
+        try:
+            me = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                self.sample_once(exclude_thread=me)
+                time.sleep(self.interval)
+        finally:
+            self._lock.release()
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        return ''.join('%s %d\n' % (stack, n) for stack, n in self.stacks.most_common())
+
+
+def acquire_request_profile() -> Optional[cProfile.Profile]:
+    """Return a new profiler for the request, or None if another request is being profiled in the process."""
+    if not _request_profile_lock.acquire(blocking=False):
+        LOG.warning('Profiler: another request is being profiled, skipped!')
+        return None
+    return cProfile.Profile()
+
+
+def _profile_path(request_id: str) -> str:
+    return os.path.join(get_profiler_config()['dir'], '%s.prof' % re.sub(r'[^\w.-]', '_', request_id))
+
+
+def save_request_profile(profile: cProfile.Profile, request_id: str) -> None:
+    """Dump the stats of the profiled request to `{dir}/{request_id}.prof`, and release the profiler."""
+    try:
+        path = _profile_path(request_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profile.dump_stats(path)
+        LOG.info('Profiler: request [%s] profiled to %s' % (request_id, path))
+    except OSError as e:
+        LOG.error('Profiler: failed to save profile of request [%s]: %s' % (request_id, e))
+    finally:
+        _request_profile_lock.release()
+
+
+def format_request_profile(request_id: str, sort: str = 'cumulative', limit: int = 50) -> Optional[str]:
+    """Stats of the profiled request as text, None if it is not found."""
+    path = _profile_path(request_id)
+    if not os.path.exists(path):
+        return None
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
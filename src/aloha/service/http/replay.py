@@ -0,0 +1,162 @@
+__all__ = ('ReplayCacheFullError', 'SeenSet', 'ReplayGuard')
+
+import asyncio
+import threading
+import time
+
+from .executor import ExecutorBusyError, run_in_executor
+from ...logger import LOG
+
+
+class ReplayCacheFullError(RuntimeError):
+    """Raised when the seen keys in the current time bucket reach `max_items`, so a new key cannot be recorded."""
+
+
+class SeenSet:
+    """Time-windowed set of keys with bounded memory: a ring of `n_buckets` sets, each covering `window / n_buckets` seconds.
+    Keys live for at least `window` seconds, whole buckets are dropped when they fall out of the window,
+    or (oldest first) when `max_items` keys are held; the current bucket is never dropped,
+    a `ReplayCacheFullError` is raised instead, so a key just added cannot be accepted again.
+    """
+
+    def __init__(self, window: float = 300, n_buckets: int = 10, max_items: int = 1000000):
+        self.window, self.n_buckets, self.max_items = window, n_buckets, max_items
+        self.span = window / n_buckets
+        self.n_evicted = 0  # number of keys dropped before expiring, because of `max_items`
+        self._buckets = {}  # bucket index (time / span) -> set of keys, ordered by index
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now_index: int):
+        # keep one more bucket than the window, so that keys added at the end of the oldest bucket still live `window` seconds
+        min_index = now_index - self.n_buckets
+        for index in [i for i in self._buckets if i < min_index]:
+            self._size -= len(self._buckets.pop(index))
+
+    def _contains(self, key, now_index: int) -> bool:
+        min_index = now_index - self.n_buckets
+        for index, bucket in self._buckets.items():
+            if index >= min_index and key in bucket:
+                return True
+        return False
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return self._contains(key, int(time.time() / self.span))
+
+    def add(self, key) -> bool:
+        """Add the key, return False if it is already in the set."""
+        now_index = int(time.time() / self.span)
+        with self._lock:
+            self._expire(now_index)
+            if self._contains(key, now_index):
+                return False
+
+            while self._size >= self.max_items:
+                index_oldest = next(iter(self._buckets))
+                if index_oldest == now_index:
+                    raise ReplayCacheFullError('Replay check: %d keys seen in %s seconds!' % (self._size, self.span))
+                oldest = self._buckets.pop(index_oldest)
+                self._size -= len(oldest)
+                self.n_evicted += len(oldest)
+                LOG.warning('Replay check: %d keys evicted before expiring, consider increasing `max_items`!' % len(oldest))
+
+            bucket = self._buckets.get(now_index)
+            if bucket is None:
+                bucket = self._buckets[now_index] = set()
+            bucket.add(key)
+            self._size += 1
+            return True
+
+    def discard(self, key) -> None:
+        """Remove the key, so it can be added again, e.g. when the request using it is not admitted."""
+        with self._lock:
+            for bucket in self._buckets.values():
+                if key in bucket:
+                    bucket.remove(key)
+                    self._size -= 1
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class ReplayGuard:
+    """Reject requests reusing a nonce (e.g. `salt_uuid` of v1 API) within a time window.
+    `seen` only looks up the in-process `SeenSet` so it is cheap to call before validating the request;
+    `add` records the nonce, and also in Redis (SET NX EX) when configured so that replays across processes are rejected;
+    `discard` removes it from both, when the request is not admitted (e.g. server busy) so the client can retry with it.
+    """
+
+    def __init__(self, window: float = 300, n_buckets: int = 10, max_items: int = 1000000, redis=None, redis_prefix: str = 'aloha:replay:'):
+        self.window = window
+        self.local = SeenSet(window=window, n_buckets=n_buckets, max_items=max_items)
+        self.redis = redis  # instance of `RedisOperator`
+        self.redis_prefix = redis_prefix
+        self._redis_conn = None
+
+    @classmethod
+    def from_config(cls, config) -> 'ReplayGuard':
+        """Create from config like `APP_OPTIONS.replay_check`, return None if it is not enabled."""
+        config = config or {}
+        if not config.get('enabled', False):
+            return None
+
+        redis = None
+        if config.get('redis'):
+            from ...db.redis import RedisOperator
+            redis = RedisOperator(config['redis'])
+
+        return cls(
+            window=float(config.get('window', 300)),
+            n_buckets=int(config.get('n_buckets', 10)),
+            max_items=int(config.get('max_items', 1000000)),
+            redis=redis,
+            redis_prefix=config.get('redis_prefix', 'aloha:replay:'),
+        )
+
+    def seen(self, nonce: str) -> bool:
+        return nonce in self.local
+
+    async def add(self, nonce: str) -> bool:
+        """Record the nonce, return False if it has been seen (in this process or in Redis) within the window.
+        The Redis command is sent in the thread pool (see `run_in_executor`), without blocking the event loop.
+        """
+        if not self.local.add(nonce):
+            return False
+        if self.redis is None:
+            return True
+        try:
+            return await run_in_executor('thread', self._add_redis, nonce)
+        except BaseException:  # e.g. `ExecutorBusyError`, the nonce is not recorded in Redis
+            self.local.discard(nonce)
+            raise
+
+    async def discard(self, nonce: str) -> None:
+        """Remove the recorded nonce from the in-process set and Redis.
+        The Redis command falls back to the default executor of the event loop if the thread pool is busy,
+        as the nonce must be released exactly when the server is overloaded.
+        """
+        self.local.discard(nonce)
+        if self.redis is None:
+            return
+        try:
+            await run_in_executor('thread', self._discard_redis, nonce)
+        except ExecutorBusyError:
+            await asyncio.get_running_loop().run_in_executor(None, self._discard_redis, nonce)
+
+    def _add_redis(self, nonce: str) -> bool:
+        try:
+            if self._redis_conn is None:
+                self._redis_conn = self.redis.connection_generic
+            return bool(self._redis_conn.set(self.redis_prefix + nonce, 1, nx=True, ex=max(int(self.window), 1)))
+        except Exception as e:  # fail open to the in-process check, Redis outage should not block all requests
+            LOG.error('Replay check: failed to record nonce in Redis: %s' % e)
+            return True
+
+    def _discard_redis(self, nonce: str) -> None:
+        try:
+            if self._redis_conn is None:
+                self._redis_conn = self.redis.connection_generic
+            self._redis_conn.delete(self.redis_prefix + nonce)
+        except Exception as e:
+            LOG.error('Replay check: failed to discard nonce in Redis: %s' % e)
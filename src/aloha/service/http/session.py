@@ -0,0 +1,73 @@
+__all__ = ('get_retry', 'new_request_session', 'get_pooled_session', 'close_pooled_sessions')
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+from ...settings import SETTINGS
+from ...util import shutdown
+
+_sessions: dict = {}  # (pid, key) -> requests.Session
+_lock = threading.Lock()
+
+
+def get_retry(total_retries: int = 3, backoff_factor: float = 0.1, allowed_methods=None, status_forcelist=None) -> Retry:
+    # https://urllib3.readthedocs.io/en/latest/reference/urllib3.util.html#urllib3.util.Retry.DEFAULT_ALLOWED_METHODS
+    try:
+        return Retry(total=total_retries, backoff_factor=backoff_factor, allowed_methods=allowed_methods, status_forcelist=status_forcelist)
+    except TypeError:  # urllib3 < 1.26
+        return Retry(total=total_retries, backoff_factor=backoff_factor, method_whitelist=allowed_methods, status_forcelist=status_forcelist)
+
+
+def new_request_session(total_retries: int = None, allowed_methods=None, status_forcelist=None, **kwargs) -> requests.Session:
+    """Create a new session with retry policy and connection pool, settings not given in arguments are read from config:
+
+    service = {
+      http_client = {
+        pool_size = 100        # max connections kept in pool for each host
+        total_retries = 3      # overwrite the default retry times of clients
+        backoff_factor = 0.1   # sleep {backoff factor} * (2 ** ({number of previous retries})) seconds between retries
+      }
+    }
+    """
+    cfg = SETTINGS.config.get('service', {}).get('http_client', None) or {}
+    pool_size = int(kwargs.get('pool_size', cfg.get('pool_size', 100)))
+    retries = get_retry(
+        total_retries=int(total_retries if total_retries is not None else cfg.get('total_retries', 3)),
+        backoff_factor=float(kwargs.get('backoff_factor', cfg.get('backoff_factor', 0.1))),
+        allowed_methods=allowed_methods, status_forcelist=status_forcelist,
+    )
+    session = requests.Session()
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, HTTPAdapter(max_retries=retries, pool_connections=pool_size, pool_maxsize=pool_size))
+    return session
+
+
+def get_pooled_session(key, **kwargs) -> requests.Session:
+    """Get a long-lived session identified by `key`, which keeps TCP/TLS connections alive across calls.
+    The session (and its urllib3 connection pool) is thread-safe for sending requests,
+    and is not shared across forked processes as sockets MUST NOT be shared.
+    """
+    key = (os.getpid(), key)
+    session = _sessions.get(key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = new_request_session(**kwargs)
+                if not _sessions:
+                    shutdown.register(close_pooled_sessions)
+                _sessions[key] = session
+    return session
+
+
+def close_pooled_sessions() -> None:
+    """Close the pooled sessions of current process, and their connections."""
+    pid = os.getpid()
+    with _lock:
+        keys = [k for k in _sessions if k[0] == pid]
+        sessions = [_sessions.pop(k) for k in keys]
+    for session in sessions:
+        session.close()
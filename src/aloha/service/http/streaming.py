@@ -0,0 +1,263 @@
+__all__ = ('StreamedPart', 'MultipartStreamParser', 'StreamingApiHandler')
+
+import inspect
+import tempfile
+from abc import ABC
+from email.message import Message
+from typing import Optional
+
+from tornado import httputil, web
+
+from .base_api_handler import AbstractApiHandler, RequestPayload
+from .files import aiter_over_request_files, iter_over_request_files
+from ...settings import SETTINGS
+
+
+class StreamedPart:
+    """A part of a multipart body, whose content is spooled to memory or a temp file when it grows large."""
+    __slots__ = ('name', 'filename', 'content_type', 'file', 'size')
+
+    def __init__(self, name: str, filename: Optional[str], content_type: str, file):
+        self.name, self.filename, self.content_type, self.file = name, filename, content_type, file
+        self.size = 0
+
+    def write(self, data) -> None:
+        self.file.write(data)
+        self.size += len(data)
+
+
+class MultipartStreamParser:
+    """Incremental parser of `multipart/form-data` body, which is fed by chunks of the body as they arrive.
+    Parts with a filename are kept in `parts` as file-like objects, other parts are kept as form fields in `fields`.
+    """
+    MAX_HEADER_SIZE: int = 64 * 1024
+
+    def __init__(self, boundary: bytes, spool_max_size: int = 1024 * 1024, temp_dir: str = None):
+        self.spool_max_size, self.temp_dir = spool_max_size, temp_dir
+        self.parts: list = []
+        self.fields: dict = {}  # name -> list of bytes values
+
+        self._delimiter = b'--' + boundary
+        self._separator = b'\r\n--' + boundary  # the delimiter inside the body always follows a CRLF
+        self._buffer = bytearray()
+        self._state = 'preamble'  # preamble -> boundary -> headers -> body -> boundary ... -> end
+        self._part: Optional[StreamedPart] = None
+
+    @classmethod
+    def from_content_type(cls, content_type: str, **kwargs) -> 'MultipartStreamParser':
+        msg = Message()
+        msg['Content-Type'] = content_type
+        boundary = msg.get_param('boundary')
+        if not boundary:
+            raise ValueError('Invalid multipart/form-data: no boundary found in Content-Type!')
+        return cls(boundary.encode('latin1'), **kwargs)
+
+    @property
+    def finished(self) -> bool:
+        return self._state == 'end'
+
+    def feed(self, chunk: bytes) -> None:
+        if self._state == 'end':
+            return  # epilogue after the close delimiter is ignored
+        self._buffer += chunk
+        while self._step():
+            pass
+
+    def close(self) -> None:
+        if self._state != 'end':
+            raise ValueError('Invalid multipart/form-data: body ended before the close delimiter!')
+
+    def _step(self) -> bool:
+        """Parse the buffer as far as possible, return True if the state changed and parsing should continue."""
+        buf = self._buffer
+        if self._state == 'preamble':
+            i = buf.find(self._delimiter)
+            if i < 0:
+                del buf[:max(0, len(buf) - len(self._delimiter))]
+                return False
+            del buf[:i + len(self._delimiter)]
+            self._state = 'boundary'
+            return True
+
+        if self._state == 'boundary':  # after a delimiter: either `--` to close, or CRLF followed by headers
+            if len(buf) < 2:
+                return False
+            if buf[:2] == b'--':
+                self._state = 'end'
+                buf.clear()
+                return False
+            del buf[:2]
+            self._state = 'headers'
+            return True
+
+        if self._state == 'headers':
+            i = buf.find(b'\r\n\r\n')
+            if i < 0:
+                if len(buf) > self.MAX_HEADER_SIZE:
+                    raise ValueError('Invalid multipart/form-data: part headers too large!')
+                return False
+            self._part = self._new_part(bytes(buf[:i]).decode('utf-8'))
+            del buf[:i + 4]
+            self._state = 'body'
+            return True
+
+        if self._state == 'body':
+            i = buf.find(self._separator)
+            if i < 0:  # keep the tail which may be the beginning of a separator
+                n = len(buf) - len(self._separator) + 1
+                if n > 0:
+                    self._part.write(buf[:n])
+                    del buf[:n]
+                return False
+            self._part.write(buf[:i])
+            del buf[:i + len(self._separator)]
+            self._end_part()
+            self._state = 'boundary'
+            return True
+
+        return False
+
+    def _new_part(self, s_headers: str) -> StreamedPart:
+        headers = httputil.HTTPHeaders.parse(s_headers)
+        msg = Message()
+        msg['Content-Disposition'] = headers.get('Content-Disposition', '')
+        name = msg.get_param('name', header='Content-Disposition')
+        if msg.get_content_disposition() != 'form-data' or not name:
+            raise ValueError('Invalid multipart/form-data: invalid Content-Disposition in part headers!')
+        file = tempfile.SpooledTemporaryFile(max_size=self.spool_max_size, dir=self.temp_dir)
+        return StreamedPart(
+            name=name, filename=msg.get_filename(), content_type=headers.get('Content-Type', 'application/unknown'), file=file
+        )
+
+    def _end_part(self) -> None:
+        part, self._part = self._part, None
+        part.file.seek(0)
+        if part.filename is None:  # a form field
+            self.fields.setdefault(part.name, []).append(part.file.read())
+            part.file.close()
+        else:
+            self.parts.append(part)
+
+    def cleanup(self) -> None:
+        for part in self.parts + ([self._part] if self._part is not None else []):
+            part.file.close()
+        self.parts, self._part = [], None
+
+
+@web.stream_request_body
+class StreamingApiHandler(AbstractApiHandler, ABC):
+    """Opt-in base handler which streams the request body instead of buffering it in memory.
+
+    The body is spooled to memory and then to a temp file once it exceeds `spool_max_size`, and multipart bodies are
+    parsed incrementally as chunks arrive. Combine it with an API handler, e.g. `class H(StreamingApiHandler, v0.APIHandler)`.
+    Settings in config (or class attributes of the same names in upper case to override them):
+
+    service = {
+      upload = {
+        max_body_size = 1073741824  # max bytes of request body
+        spool_max_size = 1048576    # bytes kept in memory for each file before spooling to disk
+        temp_dir = null             # directory of spooled temp files, use system default if not specified
+      }
+    }
+    """
+    MAX_BODY_SIZE: Optional[int] = None
+    SPOOL_MAX_SIZE: Optional[int] = None
+
+    def __init__(self, *args, **kwargs):
+        self._stream_parser: Optional[MultipartStreamParser] = None
+        self._stream_file = None
+        self._stream_error: Optional[ValueError] = None
+        super().__init__(*args, **kwargs)
+
+    async def prepare(self):
+        cfg = SETTINGS.config.get('service', {}).get('upload', None) or {}
+        max_body_size = self.MAX_BODY_SIZE or int(cfg.get('max_body_size', 1024 ** 3))
+        spool_max_size = self.SPOOL_MAX_SIZE or int(cfg.get('spool_max_size', 1024 ** 2))
+        temp_dir = cfg.get('temp_dir', None)
+        self.request.connection.set_max_body_size(max_body_size)
+
+        if self.request_header_content_type.startswith('multipart/form-data'):
+            try:
+                self._stream_parser = MultipartStreamParser.from_content_type(
+                    self.request_header_content_type, spool_max_size=spool_max_size, temp_dir=temp_dir
+                )
+            except ValueError:
+                return self.finish(self.MAP_ERROR_INFO['BAD_REQUEST'])
+        else:
+            self._stream_file = tempfile.SpooledTemporaryFile(max_size=spool_max_size, dir=temp_dir)
+
+        ret = super().prepare()
+        if inspect.isawaitable(ret):
+            await ret
+
+    def data_received(self, chunk: bytes) -> None:
+        if self._stream_parser is not None:
+            if self._stream_error is None:
+                try:
+                    self._stream_parser.feed(chunk)
+                except ValueError as e:  # invalid body, keep receiving but stop parsing
+                    self._stream_error = e
+        elif self._stream_file is not None:
+            self._stream_file.write(chunk)
+
+    @property
+    def request_stream(self):
+        """File-like object of the whole (non-multipart) request body."""
+        if self._stream_file is not None:
+            self._stream_file.seek(0)
+        return self._stream_file
+
+    @property
+    def payload(self) -> RequestPayload:
+        if self._payload is None:
+            if self._stream_parser is not None:  # form fields are merged into request arguments like tornado does
+                try:
+                    self._check_stream_parser()
+                except ValueError:
+                    if not self._finished:
+                        self.finish(self.MAP_ERROR_INFO['BAD_REQUEST'])
+                else:
+                    for name, values in self._stream_parser.fields.items():
+                        self.request.body_arguments.setdefault(name, []).extend(values)
+                        self.request.arguments.setdefault(name, []).extend(values)
+            elif self._stream_file is not None:  # a JSON body has to be parsed as a whole anyway
+                self.request.body = self.request_stream.read()
+            self._payload = RequestPayload(self.request)
+        return self._payload
+
+    def iter_request_files(self, url_files: list = None):
+        """Same as `iter_over_request_files`, while the multipart files are yielded as file-like objects:
+        (file_key, file_name, content_type, file)
+        """
+        yield from self._iter_stream_parts()
+        yield from iter_over_request_files(self.request, url_files)
+
+    async def aiter_request_files(self, url_files: list = None, **kwargs):
+        """Async version of `iter_request_files`, the `url_files` are downloaded concurrently without blocking the event loop,
+        see `aiter_over_request_files` for the kwargs (e.g. `max_concurrency`, `max_size`, `time_limit`).
+        """
+        for item in self._iter_stream_parts():
+            yield item
+        async for item in aiter_over_request_files(self.request, url_files, as_file=True, **kwargs):
+            yield item
+
+    def _iter_stream_parts(self):
+        if self._stream_parser is not None:
+            self._check_stream_parser()
+            for part in self._stream_parser.parts:
+                part.file.seek(0)
+                yield part.name, part.filename, part.content_type, part.file
+
+    def _check_stream_parser(self) -> None:
+        if self._stream_error is not None:
+            raise self._stream_error
+        self._stream_parser.close()
+
+    def on_finish(self) -> None:
+        try:
+            super().on_finish()
+        finally:
+            if self._stream_parser is not None:
+                self._stream_parser.cleanup()
+            if self._stream_file is not None:
+                self._stream_file.close()
@@ -0,0 +1,70 @@
+__all__ = ('PhaseTimer', 'NULL_TIMER', 'get_timing_config', 'get_slow_logger', 'format_server_timing')
+
+import logging
+import os
+import time
+from contextlib import nullcontext
+
+from ...settings import SETTINGS
+
+NULL_TIMER = nullcontext()  # used when timing is disabled, so the instrumented code costs nothing
+_config: dict = None
+_slow_logger: logging.Logger = None
+
+
+def get_timing_config() -> dict:
+    """Read per-request timing settings from config, e.g.:
+
+    service = {
+      timing = {
+        enabled = true        # record the time spent in each phase: parse, auth, handler, serialize, write
+        header = true         # send the phases in `Server-Timing` header of response
+        slow_threshold = 1.0  # seconds, requests slower than this are written to the slow log, 0 to disable
+      }
+    }
+    """
+    global _config
+    if _config is None:
+        cfg = SETTINGS.config.get('service', {}).get('timing', None) or {}
+        _config = {
+            'enabled': bool(cfg.get('enabled', False)),
+            'header': bool(cfg.get('header', True)),
+            'slow_threshold': float(cfg.get('slow_threshold', 1.0)),
+        }
+    return _config
+
+
+@SETTINGS.subscribe('service.timing')
+def _on_config_changed(value):
+    global _config
+    _config = None  # read again on next access
+
+
+def get_slow_logger() -> logging.Logger:
+    """Logger writing slow requests to a dedicated file `slow_{APP_MODULE}_*.log`."""
+    global _slow_logger
+    if _slow_logger is None:
+        from ...logger import get_logger
+        module = SETTINGS.config.get('APP_MODULE') or os.environ.get('APP_MODULE', 'default')
+        _slow_logger = get_logger(level=logging.INFO, logger_name='slow', module='slow_%s' % module)
+    return _slow_logger
+
+
+class PhaseTimer:
+    """Context manager adding the time spent in the block to `timings[phase]` (in seconds)."""
+    __slots__ = ('timings', 'phase', '_start')
+
+    def __init__(self, timings: dict, phase: str):
+        self.timings, self.phase = timings, phase
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.timings[self.phase] = self.timings.get(self.phase, 0) + time.perf_counter() - self._start
+
+
+def format_server_timing(timings: dict) -> str:
+    """Format as the value of `Server-Timing` header, durations in milliseconds, e.g.: `parse;dur=0.12, handler;dur=5.3`"""
+    return ', '.join('%s;dur=%.2f' % (phase, t * 1000) for phase, t in timings.items())
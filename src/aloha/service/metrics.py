@@ -0,0 +1,25 @@
+__all__ = ('MetricsHandler', 'default_handlers')
+
+from typing import Optional, Awaitable
+
+from tornado import web
+
+from .http.metrics import METRICS, get_metrics_config
+
+
+class MetricsHandler(web.RequestHandler):
+    """Metrics of requests in Prometheus text format, aggregated from all worker processes of the service."""
+
+    def data_received(self, chunk: bytes) -> Optional[Awaitable[None]]:
+        pass
+
+    def get(self):
+        text = METRICS.render(METRICS.aggregate())
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.finish(text)
+
+
+# add `aloha.service.metrics` to `service.modules` in config to mount the route
+default_handlers = [
+    (get_metrics_config()['path'], MetricsHandler),
+]
@@ -3,8 +3,8 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 from requests import Session
-from requests.adapters import HTTPAdapter, Retry
 
+from ..http.session import get_pooled_session, new_request_session
 from ...logger import LOG
 
 try:
@@ -28,22 +28,28 @@ class OpenApiClient:
 
     @classmethod
     def get_request_session(cls, total_retries: int = 10, *args, **kwargs) -> Session:
-        session = Session()
-        # https://urllib3.readthedocs.io/en/latest/reference/urllib3.util.html#urllib3.util.Retry.DEFAULT_ALLOWED_METHODS
-        retries = Retry(
-            total=total_retries, backoff_factor=0.1, method_whitelist=cls.retry_method_whitelist, status_forcelist=cls.retry_status_forcelist
+        """Create a new session, use `self.session` instead to reuse connections across calls.
+        Settings not given in arguments (e.g. `pool_size`, `backoff_factor`) are read from `service.http_client` in config.
+        """
+        return new_request_session(
+            total_retries=total_retries, allowed_methods=cls.retry_method_whitelist, status_forcelist=cls.retry_status_forcelist, **kwargs
+        )
+
+    @property
+    def session(self) -> Session:
+        """Long-lived session with connection pool, shared by clients of the same token URL in the process."""
+        return get_pooled_session(
+            (type(self).__name__, self.url_oauth_get_token), total_retries=10,
+            allowed_methods=self.retry_method_whitelist, status_forcelist=self.retry_status_forcelist
         )
-        for prefix in ('http://', 'https://'):
-            session.mount(prefix, HTTPAdapter(max_retries=retries))
-        return session
 
     def get_access_token(self) -> str:
         now = datetime.now()
 
-        if self.expires_at is None or self.expires_at > now:
+        if self.expires_at is None or self.expires_at <= now:
             try:
                 # refresh access_token
-                resp = self.get_request_session().post(self.url_oauth_get_token, timeout=5, json={
+                resp = self.session.post(self.url_oauth_get_token, timeout=5, json={
                     'client_id': self.client_id,
                     'client_secret': self.client_secret,
                     'grant_type': self.grant_type
@@ -86,7 +92,7 @@ class OpenApiClient:
         url = self._get_request_url(url_api)
         LOG.debug('Calling ESG POST: %s' % url)
         try:
-            resp = self.get_request_session().post(url=url, headers=headers, json=body, timeout=timeout)
+            resp = self.session.post(url=url, headers=headers, json=body, timeout=timeout)
             return self._get_data_from_esg_response(resp)
         except Exception as e:
             LOG.error('Error calling ESG API POST [%s]: %s' % (url, str(e)))
@@ -95,7 +101,7 @@ class OpenApiClient:
         url = self._get_request_url(url_api)
         LOG.debug('Calling ESG GET: %s' % url)
         try:
-            resp = self.get_request_session().get(url=url, headers=headers, json=body, timeout=timeout)
+            resp = self.session.get(url=url, headers=headers, json=body, timeout=timeout)
             return self._get_data_from_esg_response(resp)
         except Exception as e:
             LOG.error('Error calling ESG API GET [%s]: %s' % (url, str(e)))
@@ -0,0 +1,61 @@
+__all__ = ('SamplingProfileHandler', 'RequestProfileHandler', 'default_handlers')
+
+from typing import Optional, Awaitable
+
+from tornado import web
+from tornado.ioloop import IOLoop
+
+from .http.profiler import ProfilerBusyError, SamplingProfiler, check_profiler_token, format_request_profile, get_profiler_config
+
+
+class _AdminHandler(web.RequestHandler):
+    def data_received(self, chunk: bytes) -> Optional[Awaitable[None]]:
+        pass
+
+    def prepare(self):
+        token = self.request.headers.get('Profile-Token') or self.get_query_argument('token', None)
+        if not check_profiler_token(token):
+            raise web.HTTPError(403)
+        self.set_header('Content-Type', 'text/plain; charset=utf-8')
+
+
+class SamplingProfileHandler(_AdminHandler):
+    """Sample the stacks of all threads in the worker process serving the request, for `seconds` (default 10),
+    return the collapsed stacks, e.g.: `curl -H 'Profile-Token: ...' ':port/admin/profile?seconds=30' | flamegraph.pl > a.svg`
+    """
+
+    async def get(self):
+        config = get_profiler_config()
+        try:
+            seconds = min(float(self.get_query_argument('seconds', '10')), config['max_seconds'])
+            interval = max(float(self.get_query_argument('interval', str(config['interval']))), 0.001)
+        except ValueError:
+            raise web.HTTPError(400, reason='Invalid seconds or interval')
+
+        profiler = SamplingProfiler(interval=interval)
+        try:  # notice: in the default executor of the event loop, not the bounded pool used by handlers
+            text = await IOLoop.current().run_in_executor(None, profiler.run, seconds)
+        except ProfilerBusyError as e:
+            raise web.HTTPError(409, reason=str(e))
+        self.finish(text)
+
+
+class RequestProfileHandler(_AdminHandler):
+    """Stats of a request profiled with header `Profile-Token`, sorted by `sort` (default cumulative)."""
+
+    def get(self, request_id: str):
+        try:
+            limit = int(self.get_query_argument('limit', '50'))
+            text = format_request_profile(request_id, sort=self.get_query_argument('sort', 'cumulative'), limit=limit)
+        except (ValueError, KeyError):  # invalid limit or sort key
+            raise web.HTTPError(400, reason='Invalid limit or sort')
+        if text is None:
+            raise web.HTTPError(404, reason='Profile not found')
+        self.finish(text)
+
+
+# add `aloha.service.profiler` to `service.modules` and set `service.profiler.token` in config to mount the routes
+default_handlers = [
+    (get_profiler_config()['path'], SamplingProfileHandler),
+    (get_profiler_config()['path'] + r'/request/([^/]+)', RequestProfileHandler),
+]
@@ -0,0 +1,242 @@
+__all__ = ('Supervisor',)
+
+import asyncio
+import gc
+import logging
+import os
+import random
+import signal
+import time
+from typing import Callable
+
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.netutil import bind_sockets
+
+from ..logger import LOG
+
+
+class Supervisor:
+    """Pre-fork master process supervising the worker processes of a web application:
+    - workers crashed (or recycled after `max_requests`) are respawned;
+    - SIGHUP reloads the config and restarts the workers one by one, so the service keeps serving;
+    - SIGTERM / SIGINT stops the workers gracefully in `graceful_timeout` seconds.
+
+    The web application is created by `app_factory` in each worker after fork, so the master holds no event loop,
+    and workers started later (respawned or restarted) load the config at that time.
+    With `reuse_port`, each worker binds its own socket with SO_REUSEPORT and the kernel balances connections across them,
+    otherwise the listening socket is bound in the master and shared by all workers.
+    """
+
+    def __init__(
+            self, app_factory: Callable, port: int, num_workers: int = None, reuse_port: bool = False,
+            max_requests: int = 0, max_requests_jitter: int = 0, graceful_timeout: float = 30, respawn_delay: float = 1,
+            reload_config: Callable = None,
+    ):
+        """
+        :param app_factory: function to create the `WebApplication` in worker process
+        :param port: port to listen
+        :param num_workers: number of worker processes, default to the number of CPU cores
+        :param reuse_port: bind a socket with SO_REUSEPORT in each worker, instead of sharing the one bound in master
+        :param max_requests: restart the worker after handling this number of requests (plus random jitter), 0 to disable
+        :param max_requests_jitter: max random number added to `max_requests` for each worker, so they do not restart together
+        :param graceful_timeout: seconds to wait for a worker to stop before killing it
+        :param respawn_delay: seconds to wait before respawning a worker that exits right after starting
+        :param reload_config: function called in master on SIGHUP before restarting workers
+        """
+        self.app_factory = app_factory
+        self.port = port
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.reuse_port = reuse_port
+        self.max_requests, self.max_requests_jitter = max_requests, max_requests_jitter
+        self.graceful_timeout, self.respawn_delay = graceful_timeout, respawn_delay
+        self.reload_config = reload_config
+
+        self.sockets = None
+        self.workers = {}  # pid -> (slot index, start time)
+        self._retiring = set()  # pid of workers being stopped by master, which should not be respawned
+        self._running = False
+        self._signal = None  # last signal received by master, handled in the main loop
+
+    @classmethod
+    def from_config(cls, config: dict, app_factory: Callable, port: int, **kwargs) -> 'Supervisor':
+        """Create from config like `service.supervisor`."""
+        return cls(
+            app_factory=app_factory,
+            port=port,
+            num_workers=int(config.get('num_workers', 0)) or None,
+            reuse_port=bool(config.get('reuse_port', False)),
+            max_requests=int(config.get('max_requests', 0)),
+            max_requests_jitter=int(config.get('max_requests_jitter', 0)),
+            graceful_timeout=float(config.get('graceful_timeout', 30)),
+            respawn_delay=float(config.get('respawn_delay', 1)),
+            **kwargs
+        )
+
+    # ---------------------------------------- master ----------------------------------------
+    def run(self):
+        LOG.info('Supervisor [%s] starting %s worker(s) at port [%s], reuse_port=%s...' % (
+            os.getpid(), self.num_workers, self.port, self.reuse_port
+        ))
+        if not self.reuse_port:
+            self.sockets = bind_sockets(self.port)
+
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._on_signal)
+
+        self._running = True
+        for slot in range(self.num_workers):
+            self._spawn(slot)
+
+        while self._running:
+            sig, self._signal = self._signal, None
+            if sig == signal.SIGHUP:
+                self.restart()
+            elif sig in (signal.SIGTERM, signal.SIGINT):
+                break
+            self._reap()
+            time.sleep(0.2)
+
+        self.stop()
+
+    def _on_signal(self, signum, frame):
+        self._signal = signum
+
+    def _spawn(self, slot: int) -> int:
+        # objects created so far (modules, config) are never scanned by the GC of workers,
+        # so their pages are shared with the master instead of being copied on write
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:  # worker process, never returns
+            exit_code = 0
+            try:
+                self._run_worker(slot)
+            except BaseException as e:
+                LOG.error('Worker [%s] exited with error: %s' % (os.getpid(), e), exc_info=True)
+                exit_code = 1
+            finally:
+                logging.shutdown()
+                os._exit(exit_code)
+
+        self.workers[pid] = (slot, time.monotonic())
+        LOG.info('Supervisor: worker [%s] started in slot %s' % (pid, slot))
+        return pid
+
+    def _reap(self):
+        """Collect exited workers, and respawn them unless stopped by master."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid not in self.workers:
+                continue
+
+            slot, started_at = self.workers.pop(pid)
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+                continue
+
+            exit_code = os.waitstatus_to_exitcode(status)
+            if exit_code == 0:
+                LOG.info('Supervisor: worker [%s] in slot %s exited, respawning...' % (pid, slot))
+            else:
+                LOG.error('Supervisor: worker [%s] in slot %s exited with code %s, respawning...' % (pid, slot, exit_code))
+            if not self._running:
+                continue
+            if time.monotonic() - started_at < self.respawn_delay:  # do not spin if the worker fails at start
+                time.sleep(self.respawn_delay)
+            self._spawn(slot)
+
+    def _stop_worker(self, pid: int):
+        """Send SIGTERM to the worker and wait for it to exit, kill it after timeout."""
+        timeout = self.graceful_timeout + 5  # the worker closes its connections in `graceful_timeout`
+        self._retiring.add(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+        deadline = time.monotonic() + timeout
+        while pid in self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+
+        if pid in self.workers:
+            LOG.warning('Supervisor: worker [%s] not stopped in %s seconds, killing it!' % (pid, timeout))
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            os.waitpid(pid, 0)
+            self.workers.pop(pid, None)
+            self._retiring.discard(pid)
+
+    def restart(self):
+        """Rolling restart: start a new worker in each slot, then stop the old one, so the port is always served."""
+        if self.reload_config is not None:
+            try:
+                self.reload_config()
+            except Exception as e:
+                LOG.error('Supervisor: failed to reload config, workers NOT restarted: %s' % e, exc_info=True)
+                return
+
+        LOG.info('Supervisor: restarting %s worker(s)...' % len(self.workers))
+        for pid, (slot, _) in list(self.workers.items()):
+            if pid not in self.workers:  # exited and respawned in the meantime
+                continue
+            self._spawn(slot)
+            time.sleep(self.respawn_delay)  # let the new worker start listening before stopping the old one
+            self._stop_worker(pid)
+
+    def stop(self):
+        self._running = False
+        LOG.info('Supervisor: stopping %s worker(s)...' % len(self.workers))
+        for pid in list(self.workers):
+            self._retiring.add(pid)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self.workers):
+            self._stop_worker(pid)
+
+    # ---------------------------------------- worker ----------------------------------------
+    def _run_worker(self, slot: int):
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        random.seed()
+
+        asyncio.set_event_loop(asyncio.new_event_loop())  # do not share the event loop (if any) created in master
+        web_app = self.app_factory()
+        sockets = self.sockets or bind_sockets(self.port, reuse_port=True)
+        web_app.http_server.add_sockets(sockets)
+
+        io_loop = IOLoop.current()
+        stopping = []
+
+        def stop():
+            if not stopping:
+                stopping.append(True)
+                io_loop.spawn_callback(_stop)
+
+        async def _stop():
+            await web_app.shutdown(self.graceful_timeout)
+            io_loop.stop()
+
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            asyncio.get_event_loop().add_signal_handler(sig, stop)
+
+        if self.max_requests > 0:
+            max_requests = self.max_requests + random.randint(0, self.max_requests_jitter)
+
+            def check_max_requests():
+                if web_app.num_requests >= max_requests:
+                    LOG.info('Worker [%s] handled %s requests, recycling...' % (os.getpid(), web_app.num_requests))
+                    stop()
+
+            PeriodicCallback(check_max_requests, 1000).start()
+
+        LOG.info('Worker [%s] serving in slot %s...' % (os.getpid(), slot))
+        io_loop.start()
@@ -1,5 +1,8 @@
+import asyncio
+import gc
 import logging
 import os
+import time
 
 from tornado import web, httpserver
 from tornado.routing import HostMatches
@@ -7,6 +10,7 @@ from tornado.routing import HostMatches
 from ..logger import LOG
 from ..logger.logger import setup_logger
 from ..settings import SETTINGS
+from ..util import shutdown
 
 setup_logger(
     logging.getLogger("tornado.access")
@@ -32,6 +36,8 @@ class WebApplication(web.Application):
         handlers = self.init_handlers(config)
         super().__init__(handlers=handlers, **config)
         self.http_server = httpserver.HTTPServer(self)
+        self.num_requests = 0  # number of requests finished, used to recycle worker processes
+        self.num_active = 0  # number of requests being handled by `AbstractApiHandler`, drained before stopping
 
     @staticmethod
     def init_handlers(config: dict):
@@ -52,14 +58,46 @@ class WebApplication(web.Application):
             (HostMatches('(.*)'), handlers)
         ]
 
-    def start(self):
-        service_settings = self.settings.get('service', {})
+    def log_request(self, handler: web.RequestHandler) -> None:
+        self.num_requests += 1
+        super().log_request(handler)
 
+    @staticmethod
+    def get_port(service_settings: dict) -> int:
         port = service_settings.get('port', int(os.environ.get('PORT_SVC', 80)))
         # if overwrite port in param
         port = os.environ.get('port', port)
+        return int(port)
+
+    def start(self):
+        service_settings = self.settings.get('service', {})
+        port = self.get_port(service_settings)
 
         num_process = int(service_settings.get('num_process', 0))
         LOG.info('Starting service with [%s] process at port [%s]...', num_process or 'undefined', port)
         self.http_server.bind(port)
+        if num_process != 1:
+            gc.freeze()  # keep pages of the objects created so far shared with the forked processes, see `Supervisor._spawn`
         self.http_server.start(num_processes=num_process)
+
+    async def stop(self, timeout: float = 30):
+        """Stop accepting new connections, wait for the in-flight requests to finish, then close the open connections.
+        All done in `timeout` seconds, requests not finished by then are dropped.
+        """
+        deadline = time.monotonic() + timeout
+        self.http_server.stop()
+        LOG.info('Stopped accepting connections, draining %s in-flight request(s)...' % self.num_active)
+        while self.num_active > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.num_active > 0:
+            LOG.warning('%s request(s) not finished in %s seconds, dropping them!' % (self.num_active, timeout))
+
+        try:
+            await asyncio.wait_for(self.http_server.close_all_connections(), max(deadline - time.monotonic(), 0.1))
+        except asyncio.TimeoutError:
+            LOG.warning('Timeout when closing connections in %s seconds!' % timeout)
+
+    async def shutdown(self, timeout: float = 30):
+        """Graceful shutdown: stop serving (see `stop`), then run the shutdown hooks to close pools and flush logs."""
+        await self.stop(timeout)
+        await shutdown.run_hooks()
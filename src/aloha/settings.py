@@ -1,9 +1,23 @@
-from .config import hocon, paths
+import os
+import threading
+import time
+from typing import Callable
+
+from .config import cache, paths
+from .config.frozen import FrozenConfig, merge
 
 
 class Settings:
     def __init__(self):
         self._config = None
+        self._overrides: dict = {}  # values set by `override`, applied on each load of the config files
+        self._subscribers: list = []  # (dotted key path, callback)
+        self._lock = threading.Lock()
+        self._watch_interval: float = 0  # seconds between checks of config files, 0 if not watching
+        self._watch_thread: threading.Thread = None
+        self._watch_files: list = None
+        self._fingerprint: dict = None
+        self._loop = None  # event loop calling the subscribers, see `notify_in`
 
     @property
     def resource_dir(self):
@@ -16,13 +30,148 @@ class Settings:
     @property
     def config(self):
         if self._config is None:
-            config_files = paths.get_config_files()  # by default, use the `main.conf` file in the config_dir
-            self._config = hocon.load_config_from_hocon_files(config_files, base_dir=paths.get_config_dir())
+            self._config = self._load_config()
+
+        return self._config
+
+    def _load_config(self):
+        config_files = paths.get_config_files()  # by default, use the `main.conf` file in the config_dir
+        # from the snapshot compiled by `aloha config compile` if the config files are not changed, see `config.cache`
+        config = cache.load_config_cached(config_files, base_dir=paths.get_config_dir())
+        if self._overrides:
+            config = merge(config, self._overrides)
+        return FrozenConfig(config)  # immutable: shared by threads and forked workers, replaced as a whole by `reload`
+
+    def reload(self):
+        """Load the config files again, the current config is kept if it fails to load.
+        The new config replaces the current one at once, then subscribers of the changed key paths are called.
+        """
+        return self._replace(self._load_config())
 
+    def override(self, values: dict):
+        """Override values of the config, e.g. in debug entry points or tests, as the config itself is immutable:
+        `SETTINGS.override({'service': {'debug': True}})`, dicts are merged recursively, other values are replaced.
+        The overrides are kept when the config files are reloaded; subscribers of the changed key paths are called.
+        """
+        with self._lock:
+            self._overrides = merge(self._overrides, values)
+        return self._replace(FrozenConfig(merge(self.config, values)))
+
+    def _replace(self, config_new):
+        config_old = self._config
+        self._config = config_new
+        if config_old is not None:
+            loop = self._loop
+            if loop is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(self._notify, config_old, config_new)
+            else:
+                self._notify(config_old, config_new)
         return self._config
 
+    # ---------------------------------------- subscriptions ----------------------------------------
+    @staticmethod
+    def get_path(config, key_path: str, default=None):
+        """Value in the config by a dotted key path, e.g. `APP_OPTIONS.replay_check`."""
+        if isinstance(config, FrozenConfig):
+            return config.get_path(key_path, default)
+        value = config
+        for key in key_path.split('.'):
+            if not isinstance(value, dict) or key not in value:
+                return default
+            value = value[key]
+        return value
+
+    def subscribe(self, key_path: str, callback: Callable = None) -> Callable:
+        """Call `callback(new_value)` when the value at the dotted key path is changed by `reload`, None if it is removed.
+        Used as a decorator if `callback` is not given, e.g. `@SETTINGS.subscribe('APP_ID_KEYS')`.
+        Notice: it is called in the event loop given to `notify_in` (e.g. the IOLoop of the web service),
+        otherwise in the thread reloading the config (see `watch`), so it should only replace the derived values.
+        """
+        if callback is None:
+            return lambda func: self.subscribe(key_path, func)
+        with self._lock:
+            self._subscribers.append((key_path, callback))
+        return callback
+
+    def notify_in(self, loop) -> None:
+        """Call the subscribers in the thread of the given asyncio event loop, so they do not race with the coroutines
+        using the derived values (e.g. the executor pools), None to call them in the thread reloading the config.
+        """
+        self._loop = loop
+
+    def unsubscribe(self, callback: Callable) -> None:
+        with self._lock:
+            self._subscribers = [(k, c) for k, c in self._subscribers if c != callback]
+
+    def _notify(self, config_old, config_new):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for key_path, callback in subscribers:
+            value = self.get_path(config_new, key_path)
+            if value == self.get_path(config_old, key_path):
+                continue
+            try:
+                callback(value)
+            except Exception as e:
+                from .logger import LOG
+                LOG.error('Failed to apply the change of config [%s] to %s: %s' % (key_path, callback, e), exc_info=True)
+
+    # ---------------------------------------- watch ----------------------------------------
+    def watch(self, interval: float = 5) -> None:
+        """Check the config files every `interval` seconds in a background thread, and `reload` when they are changed.
+        The thread is restarted in forked child processes, e.g. workers of the web service.
+
+        Values applied by the subscribers of aloha: `APP_ID_KEYS`, `APP_OPTIONS` (sign method, replay check, token cache),
+        `APP_SECRET_KEY`, `service.executor`, `service.json_codec`, `service.timing`, `service.profiler`,
+        and values read on each request (e.g. `service.upload`, config of API clients).
+        Notice: values read once are NOT reloaded, restart the service to apply them:
+        `service.port` / `num_process` / `supervisor` / `modules`, `service.http_client` (pools of created sessions),
+        `service.metrics`, `deploy.log_*`, and connections of `aloha.db` (including passwords from the vaults).
+        """
+        self._watch_interval = interval
+        if self._watch_thread is None:
+            self._watch_files = self._watch_files or paths.get_config_files()
+            self._fingerprint = self._compute_fingerprint()
+            self._watch_thread = threading.Thread(target=self._watch, name='aloha-config-watch', daemon=True)
+            self._watch_thread.start()
+
+    def _compute_fingerprint(self) -> dict:
+        return cache.compute_fingerprint(self._watch_files, paths.get_config_dir())
+
+    def _watch(self):
+        while self._watch_interval > 0:
+            time.sleep(self._watch_interval)
+            try:
+                fingerprint = self._compute_fingerprint()
+                if fingerprint == self._fingerprint:
+                    continue
+                self._fingerprint = fingerprint  # a failed reload is retried when the files are changed again
+                self.reload()
+                from .logger import LOG
+                LOG.info('Config reloaded in process [%s] as config files changed.' % os.getpid())
+            except Exception as e:  # e.g. invalid config files, keep the current config and check again later
+                from .logger import LOG
+                LOG.error('Failed to reload config: %s' % e)
+
+    def _after_fork_in_child(self):
+        self._loop = None  # the loop of the parent process is not running here
+        if self._watch_thread is not None:
+            self._watch_thread = None
+            self.watch(self._watch_interval)
+
     def __getitem__(self, item):
         return self.config[item]
 
 
+class ConfigProperty:
+    """Class attribute returning the current `SETTINGS.config` on access, instead of the one loaded at import,
+    e.g. `config = ConfigProperty()` in class body, so the config reloaded by `SETTINGS.reload` is used.
+    """
+
+    def __get__(self, obj, owner=None):
+        return SETTINGS.config
+
+
 SETTINGS = Settings()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=SETTINGS._after_fork_in_child)
@@ -2,9 +2,9 @@ import unittest
 from abc import ABC
 
 from ..logger import LOG
-from ..settings import SETTINGS
+from ..settings import ConfigProperty
 
 
 class UnitTestCase(unittest.TestCase, ABC):
     LOG = LOG
-    config = SETTINGS.config
+    config = ConfigProperty()  # the current config, reloaded if the config files are changed
@@ -0,0 +1,59 @@
+__all__ = ('register', 'unregister', 'run_hooks')
+
+import inspect
+import logging
+import threading
+import weakref
+from typing import Callable
+
+from ..logger import LOG
+
+_hooks: list = []  # callables, or `weakref.WeakMethod` of bound methods
+_lock = threading.Lock()
+_prune_at = 64  # drop the dead weak references when the number of hooks reaches this
+
+
+def register(func: Callable, weak: bool = False) -> Callable:
+    """Register a function (or coroutine function) to be called without arguments when the service shuts down,
+    the last registered is called first.
+    With `weak=True`, a bound method is referenced weakly, so objects like DB operators created per request are not kept alive.
+    """
+    global _prune_at
+    with _lock:
+        _hooks.append(weakref.WeakMethod(func) if weak else func)
+        if len(_hooks) >= _prune_at:
+            _hooks[:] = [h for h in _hooks if not (isinstance(h, weakref.WeakMethod) and h() is None)]
+            _prune_at = max(64, 2 * len(_hooks))
+    return func
+
+
+def unregister(func: Callable) -> None:
+    with _lock:
+        _hooks[:] = [h for h in _hooks if h != func and not (isinstance(h, weakref.WeakMethod) and h() == func)]
+
+
+async def run_hooks() -> None:
+    """Call the registered shutdown hooks once (awaiting coroutine functions),
+    errors are logged and do not stop the others; then flush the log handlers.
+    """
+    with _lock:
+        hooks = _hooks[::-1]
+        _hooks.clear()
+
+    for hook in hooks:
+        func = hook() if isinstance(hook, weakref.WeakMethod) else hook
+        if func is None:  # object of the method already garbage collected
+            continue
+        try:
+            result = func()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            LOG.error('Failed to run shutdown hook %s: %s' % (func, e))
+
+    for logger in [logging.getLogger()] + list(logging.Logger.manager.loggerDict.values()):
+        for handler in getattr(logger, 'handlers', ()):  # notice: `loggerDict` may contain `PlaceHolder` objects
+            try:
+                handler.flush()
+            except Exception:
+                pass
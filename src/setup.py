@@ -40,7 +40,7 @@ setup(
     package_data={},
     platforms='Linux, Mac OS X, Windows',
     zip_safe=False,
-    install_requires=['attrdict3', 'pyhocon', 'pycryptodome', 'packaging'],
+    install_requires=['pyhocon', 'pycryptodome', 'packaging'],
     extras_require={
         **dict_extra_requires,
         'all': sorted(y for x in dict_extra_requires.values() for y in x),
@@ -0,0 +1,107 @@
+import json
+import unittest
+from unittest import mock
+
+from tornado.testing import AsyncHTTPTestCase, gen_test
+from tornado.web import Application
+
+from aloha.service.api import v1
+from aloha.service.http import executor
+from aloha.service.http.executor import ExecutorBusyError
+from aloha.service.http.replay import ReplayGuard
+
+APP_ID, APP_KEY = 'app1', 'key1'
+
+
+class EchoHandler(v1.APIHandler):
+    EXECUTOR = 'thread'
+
+    def response(self, **kwargs):
+        return kwargs
+
+
+class FakeRedis:
+    def __init__(self):
+        self.keys = set()
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.keys:
+            return None
+        self.keys.add(key)
+        return True
+
+    def delete(self, key):
+        self.keys.discard(key)
+
+
+class TestReplayRetryAfterBusy(AsyncHTTPTestCase):
+    def setUp(self):
+        self.guard = ReplayGuard(window=60)
+        for patcher in (
+                mock.patch.object(v1, 'APP_ID_KEYS', {APP_ID: APP_KEY}),
+                mock.patch.object(v1, 'REPLAY_GUARD', self.guard),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def get_app(self):
+        return Application([(r'/echo', EchoHandler)])
+
+    def post_echo(self, body: dict) -> tuple:
+        resp = self.fetch('/echo', method='POST', body=json.dumps(body), headers={'Content-Type': 'application/json'})
+        return resp.code, json.loads(resp.body)
+
+    def test_retry_with_same_salt_after_503(self):
+        body = v1.APICaller().wrap_request_data(data={'a': 1}, app_id=APP_ID, app_key=APP_KEY)
+
+        with mock.patch.dict(executor._pending, {'thread': 10 ** 9}):  # the thread pool is full
+            code, resp = self.post_echo(body)
+        self.assertEqual(code, 503)
+        self.assertEqual(resp['code'], '5103')
+
+        code, resp = self.post_echo(body)  # retried by the client with the same salt
+        self.assertEqual(code, 200)
+        self.assertEqual(resp['code'], 5200)
+        self.assertEqual(resp['data'], {'a': 1})
+
+        code, resp = self.post_echo(body)  # the salt is recorded once the request is admitted
+        self.assertEqual(resp['code'], '5105')
+
+
+class TestReplayGuardDiscard(AsyncHTTPTestCase):
+    def get_app(self):
+        return Application()
+
+    def setUp(self):
+        super().setUp()
+        self.guard = ReplayGuard(window=60, redis=object())
+        self.guard._redis_conn = FakeRedis()
+
+    @gen_test
+    async def test_discard_local_and_redis(self):
+        self.assertTrue(await self.guard.add('app1:salt'))
+        self.assertFalse(await self.guard.add('app1:salt'))
+        await self.guard.discard('app1:salt')
+        self.assertFalse(self.guard.seen('app1:salt'))
+        self.assertEqual(self.guard._redis_conn.keys, set())
+        self.assertTrue(await self.guard.add('app1:salt'))
+
+    @gen_test
+    async def test_add_not_recorded_if_busy(self):
+        with mock.patch.dict(executor._pending, {'thread': 10 ** 9}):
+            with self.assertRaises(ExecutorBusyError):
+                await self.guard.add('app1:salt')
+        self.assertFalse(self.guard.seen('app1:salt'))
+        self.assertTrue(await self.guard.add('app1:salt'))
+
+    @gen_test
+    async def test_discard_if_busy(self):
+        self.assertTrue(await self.guard.add('app1:salt'))
+        with mock.patch.dict(executor._pending, {'thread': 10 ** 9}):
+            await self.guard.discard('app1:salt')
+        self.assertEqual(self.guard._redis_conn.keys, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# Benchmark calls/sec of `AbstractApiClient.call` with a new session per call (before) vs the pooled session (after).
+# Usage: cd src && python ../tool/benchmark/bench_api_client_session.py [--number 500] [--threads 4]
+
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tornado import web
+
+from aloha.service.http import AbstractApiClient
+
+
+class EchoHandler(web.RequestHandler):
+    def post(self):
+        self.set_header('Content-Type', 'application/json')
+        self.finish(self.request.body)
+
+
+def _start_server(port: int):
+    def run():
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        web.Application([(r'/echo', EchoHandler)]).listen(port, address='127.0.0.1')
+        asyncio.get_event_loop().run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    time.sleep(0.5)
+
+
+class PooledClient(AbstractApiClient):
+    def wrap_request_data(self, data: dict) -> dict:
+        return data
+
+
+class NewSessionClient(PooledClient):
+    @property
+    def session(self):
+        return self.get_request_session()  # the behavior before: a new session (and connection) for every call
+
+
+def _bench(client: AbstractApiClient, number: int, threads: int) -> float:
+    payload = {'id': 1, 'name': 'aloha', 'values': list(range(50))}
+    t = time.time()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: client.call('echo', data=dict(payload)), range(number)))
+    return number / (time.time() - t)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--number', type=int, default=500, help='number of calls for each test')
+    p.add_argument('--threads', type=int, default=4, help='number of concurrent threads calling the API')
+    p.add_argument('--port', type=int, default=18901)
+    args = p.parse_args()
+
+    _start_server(args.port)
+    url = 'http://127.0.0.1:%s/' % args.port
+    for name, cls in (('new session per call', NewSessionClient), ('pooled session', PooledClient)):
+        calls_per_sec = _bench(cls(url), number=args.number, threads=args.threads)
+        print('%-24s %10.1f calls/sec' % (name, calls_per_sec))
+
+
+if __name__ == '__main__':
+    main()
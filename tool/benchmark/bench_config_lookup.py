@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# Benchmark config lookups on hot paths: `AttrDict` (previous `SETTINGS.config`) vs `FrozenConfig` and its accessors.
+# Usage: cd src && PYTHONPATH=. python ../tool/benchmark/bench_config_lookup.py [--number 1000000]
+# Requires: pip install attrdict3  # the baseline, no longer a dependency of aloha
+
+import argparse
+import timeit
+
+from attrdict import AttrDict
+
+from aloha.config.frozen import FrozenConfig
+
+CONFIG = {
+    'APP_MODULE': 'bench',
+    'APP_SECRET_KEY': 'secret',
+    'APP_ID_KEYS': {'app%d' % i: 'key%d' % i for i in range(100)},
+    'service': {
+        'port': 80,
+        'json_codec': 'orjson',
+        'timing': {'enabled': 'true', 'header': True, 'slow_threshold': '1.0'},
+        'modules': ['app.api'],
+    },
+    'deploy': {'kafka_default': {'host': [{'host': 'localhost', 'port': 9092}]}},
+}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--number', type=int, default=1000000, help='number of iterations for each test')
+    args = p.parse_args()
+
+    a, f = AttrDict(CONFIG), FrozenConfig(CONFIG)
+    tests = [
+        ('AttrDict [key]', lambda: a['APP_SECRET_KEY']),
+        ('Frozen [key]', lambda: f['APP_SECRET_KEY']),
+        ('AttrDict .get nested', lambda: a.get('service', {}).get('timing', None).get('slow_threshold')),
+        ('Frozen .get nested', lambda: f.get('service', {}).get('timing', None).get('slow_threshold')),
+        ('AttrDict attr nested', lambda: a.service.timing.slow_threshold),
+        ('Frozen get_path', lambda: f.get_path('service.timing.slow_threshold')),
+        ('AttrDict float()', lambda: float(a['service']['timing']['slow_threshold'])),
+        ('Frozen get_float', lambda: f.get_float('service.timing.slow_threshold')),
+    ]
+    for label, func in tests:
+        t = timeit.timeit(func, number=args.number)
+        print('%-22s %10.1f ns' % (label, t / args.number * 1e9))
+
+
+if __name__ == '__main__':
+    main()
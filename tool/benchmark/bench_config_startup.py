@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# Benchmark loading the config at startup: parsing the HOCON files vs loading the snapshot compiled by `aloha config compile`.
+# Usage: cd demo && PYTHONPATH=../src python ../tool/benchmark/bench_config_startup.py [--number 20]
+
+import argparse
+import os
+import tempfile
+import timeit
+
+from aloha.config import cache, hocon, paths
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--config-dir', type=str, default=None, help='config dir, default to `resource/config` in current dir')
+    p.add_argument('--files', type=str, default='main.conf', help='config files to load, separated by comma')
+    p.add_argument('--number', type=int, default=20, help='number of iterations for each test')
+    args = p.parse_args()
+
+    base_dir = os.path.abspath(args.config_dir or paths.get_config_dir())
+    config_files = args.files.split(',')
+    with tempfile.TemporaryDirectory() as dir_cache:
+        os.environ['DIR_CONFIG_CACHE'] = dir_cache  # do not touch the snapshot of the project
+        config = hocon.load_plain_config_from_hocon_files(config_files, base_dir=base_dir)
+        cache.save_snapshot(config, config_files, base_dir)
+        assert cache.load_snapshot(config_files, base_dir) == config
+
+        tests = [
+            ('parse HOCON', lambda: hocon.load_plain_config_from_hocon_files(config_files, base_dir=base_dir)),
+            ('load snapshot', lambda: cache.load_snapshot(config_files, base_dir)),
+        ]
+        for label, func in tests:
+            t = timeit.timeit(func, number=args.number)
+            print('%-16s %10.2f ms' % (label, t / args.number * 1000))
+
+
+if __name__ == '__main__':
+    main()
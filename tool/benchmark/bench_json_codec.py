@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# Benchmark the JSON codecs in `aloha.service.http.codec` on representative API payloads.
+# Usage: cd src && python ../tool/benchmark/bench_json_codec.py [--number 200]
+
+import argparse
+import timeit
+from datetime import datetime
+
+from aloha.service.http.codec import get_codec
+
+
+def _payloads() -> dict:
+    small = {'code': 5200, 'message': ['success'], 'data': {'id': 1, 'name': 'aloha', 'score': 0.98}}
+    records = [
+        {'id': i, 'name': 'item-%s' % i, 'price': i * 1.1, 'tags': ['a', 'b', '中文'], 'ts': datetime(2024, 1, 1, 12, 0, i % 60)}
+        for i in range(1000)
+    ]
+    nested = {'level-%s' % i: {'values': list(range(100)), 'text': 'x' * 200, 'flag': bool(i % 2)} for i in range(200)}
+    return {'small': small, 'records-1k': {'code': 5200, 'data': records}, 'nested': nested}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--number', type=int, default=200, help='number of iterations for each test')
+    p.add_argument('--codecs', type=str, nargs='*', default=('json', 'orjson', 'ujson', 'msgspec'))
+    args = p.parse_args()
+
+    payloads = _payloads()
+    print('%-10s %-12s %10s %14s %14s' % ('codec', 'payload', 'bytes', 'dumps (us)', 'loads (us)'))
+    for name in args.codecs:
+        codec = get_codec(name)
+        if codec.name != name:  # package not installed, fallback to stdlib
+            print('%-10s skipped: not installed' % name)
+            continue
+        for key, payload in payloads.items():
+            raw = codec.dumps(payload)
+            t_dumps = timeit.timeit(lambda: codec.dumps(payload), number=args.number) / args.number
+            t_loads = timeit.timeit(lambda: codec.loads(raw), number=args.number) / args.number
+            print('%-10s %-12s %10d %14.1f %14.1f' % (name, key, len(raw), t_dumps * 1e6, t_loads * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# Benchmark records/sec written by `MultiProcessSafeDailyRotatingFileHandler`:
+# previous rollover check (file name formatted by `time.strftime` for every record) vs precomputed midnight timestamp.
+# Usage: cd src && python ../tool/benchmark/bench_log_rollover.py [--number 200000]
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+import timeit
+
+from aloha.logger.handler import MultiProcessSafeDailyRotatingFileHandler
+
+
+class HandlerBefore(MultiProcessSafeDailyRotatingFileHandler):
+    def shouldRollover(self, record):
+        return self.currentFileName != self._compute_fn()
+
+
+def _bench(handler_cls, folder: str, name: str, number: int, **kwargs) -> float:
+    handler = handler_cls(os.path.join(folder, '%s.log' % name), **kwargs)
+    handler.setFormatter(logging.Formatter('%(levelname)s> %(asctime)s> %(module)s:%(lineno)s> %(message)s'))
+    logger = logging.Logger(name)
+    logger.addHandler(handler)
+    t = time.perf_counter()
+    for i in range(number):
+        logger.info('request %d handled', i)
+    t = time.perf_counter() - t
+    handler.close()
+    return number / t
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--number', type=int, default=200000, help='number of records written in each test')
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        tests = [
+            ('before', HandlerBefore, {}),
+            ('after', MultiProcessSafeDailyRotatingFileHandler, {}),
+            ('after, 1MB', MultiProcessSafeDailyRotatingFileHandler, {'max_bytes': 1024 * 1024}),
+            ('after, 1MB + gzip', MultiProcessSafeDailyRotatingFileHandler, {'max_bytes': 1024 * 1024, 'compress': True}),
+        ]
+        for i, (label, handler_cls, kwargs) in enumerate(tests):
+            rate = _bench(handler_cls, folder, 'test%d' % i, args.number, **kwargs)
+            print('%-20s %12.0f records/s' % (label, rate))
+        record = logging.makeLogRecord({'msg': 'request handled'})
+        for label, handler_cls in (('before', HandlerBefore), ('after', MultiProcessSafeDailyRotatingFileHandler)):
+            handler = handler_cls(os.path.join(folder, 'check.log'), delay=True)
+            t = timeit.timeit(lambda: handler.shouldRollover(record), number=args.number)
+            print('%-20s %12.3f us per shouldRollover()' % (label, t / args.number * 1e6))
+
+        time.sleep(1)  # wait for the compression threads
+        print('Files: %s' % ', '.join(sorted(os.listdir(folder))[:12]))
+
+
+if __name__ == '__main__':
+    main()
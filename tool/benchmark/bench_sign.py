@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# Benchmark v1 sign check on large payloads: previous implementation (serialize twice + concatenate) vs `aloha.encrypt.sign`.
+# Usage: cd src && python ../tool/benchmark/bench_sign.py [--size-mb 1] [--number 20]
+
+import argparse
+import hashlib
+import json
+import timeit
+
+from aloha.encrypt import sign as signer
+
+
+def sign_check_before(salt_uuid: str, app_id: str, sign: str, app_key: str, data) -> bool:
+    func_sign_check = lambda s: hashlib.md5(s.encode()).hexdigest()  # noqa: E731
+    data_str = str(json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')))  # noqa: F841, unused as before
+    right_sign = func_sign_check(app_id + salt_uuid + app_key)
+    if sign == right_sign:
+        return True
+    public_key = str(json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')))
+    public_key = app_id + salt_uuid + public_key + app_key
+    return sign == func_sign_check(public_key)
+
+
+def _payload(size_mb: float) -> dict:
+    n = int(size_mb * 1024 * 1024 / 100)
+    return {'rows': [{'id': i, 'name': '名称-%08d' % i, 'value': i * 0.5, 'tags': ['x', 'y']} for i in range(n)]}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--size-mb', type=float, default=1, help='approximate size of the payload in MB')
+    p.add_argument('--number', type=int, default=20, help='number of iterations for each test')
+    args = p.parse_args()
+
+    data = _payload(args.size_mb)
+    app_id, salt_uuid, app_key = 'app_id', 'd0c8b1f6-0000-11ef-8000-000000000000', 'app_key'
+    print('Payload size: %.2f MB' % (len(signer.canonical_json(data)) / 1024 / 1024))
+
+    for method in ('md5', 'sha256', 'hmac-sha256'):
+        sign = signer.get_sign(app_id=app_id, salt_uuid=salt_uuid, app_key=app_key, data=data, sign_method=method)
+        assert signer.check_sign(sign, app_id=app_id, salt_uuid=salt_uuid, app_key=app_key, data=data, sign_method=method)
+        if method == 'md5':
+            assert sign_check_before(salt_uuid, app_id, sign, app_key, data)
+            t = timeit.timeit(lambda: sign_check_before(salt_uuid, app_id, sign, app_key, data), number=args.number)
+            print('%-12s %-8s %10.2f ms' % ('md5', 'before', t / args.number * 1000))
+        t = timeit.timeit(
+            lambda: signer.check_sign(sign, app_id=app_id, salt_uuid=salt_uuid, app_key=app_key, data=data, sign_method=method),
+            number=args.number
+        )
+        print('%-12s %-8s %10.2f ms' % (method, 'after', t / args.number * 1000))
+
+
+if __name__ == '__main__':
+    main()